@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+#
+# Benchmark of history integration of the Average Sensor
+#
+# Copyright (c) 2019, Andrey "Limych" Khrolenok <andrey@khrolenok.ru>
+# Creative Commons BY-NC-SA 4.0 International Public License
+# (see LICENSE.md or https://creativecommons.org/licenses/by-nc-sa/4.0/)
+#
+"""
+Benchmark of history integration of the Average Sensor.
+
+Feeds synthetic history of source entities into AverageSensor through
+a stubbed recorder history module and states machine, then reports wall
+time, allocations and peak memory of the initial load and of following
+incremental updates.
+
+Requires Home Assistant to be installed in the running environment.
+"""
+import argparse
+import gc
+import os
+import random
+import sys
+import time
+import tracemalloc
+from bisect import bisect_left, bisect_right
+from datetime import timedelta
+from types import SimpleNamespace
+from unittest import mock
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# pylint: disable=wrong-import-position
+import homeassistant.util.dt as dt_util
+from homeassistant.const import (
+    ATTR_UNIT_OF_MEASUREMENT, STATE_UNAVAILABLE)
+from homeassistant.core import State
+
+from custom_components.average import loader, sensor
+from custom_components.average.loader import HistoryLoader
+from custom_components.average.rollup import RollupStore
+
+UNIT = 'W'
+
+
+class FakeHistory:
+    """Stub of recorder history module serving pregenerated states."""
+
+    def __init__(self, history):
+        """Initialize the stub."""
+        self._history = history
+        self._timestamps = {
+            entity_id: [item.last_changed for item in states]
+            for entity_id, states in history.items()
+        }
+        self.queries = 0
+
+    # pylint: disable=unused-argument
+    def get_significant_states(self, hass, start_time, end_time=None,
+                               entity_ids=None,
+                               include_start_time_state=True):
+        """Return states of entities changed during the period."""
+        self.queries += 1
+        result = {}
+        for entity_id in entity_ids:
+            states = self._history.get(entity_id, [])
+            timestamps = self._timestamps.get(entity_id, [])
+            first = bisect_right(timestamps, start_time)
+            last = bisect_left(timestamps, end_time)
+            items = states[first:last]
+            if include_start_time_state and first:
+                prev = states[first - 1]
+                items.insert(0, State(
+                    entity_id, prev.state, prev.attributes,
+                    start_time, start_time))
+            if items:
+                result[entity_id] = items
+        return result
+
+
+class FakeStates:
+    """Stub of states machine returning the last state before now."""
+
+    def __init__(self, history, clock):
+        """Initialize the stub."""
+        self._history = history
+        self._timestamps = {
+            entity_id: [item.last_changed for item in states]
+            for entity_id, states in history.items()
+        }
+        self._clock = clock
+
+    def get(self, entity_id):
+        """Return state of entity at the current fake time."""
+        states = self._history.get(entity_id)
+        if not states:
+            return None
+        i = bisect_right(self._timestamps[entity_id], self._clock.now)
+        return states[max(i - 1, 0)]
+
+
+class Clock:
+    """Controllable current time."""
+
+    def __init__(self, now):
+        """Initialize the clock."""
+        self.now = now
+
+    def utcnow(self):
+        """Return current fake time."""
+        return self.now
+
+
+def make_history(args, start, end) -> dict:
+    """Generate random walk states of source entities."""
+    rnd = random.Random(args.seed)
+    history = {}
+    for i in range(args.entities):
+        entity_id = 'sensor.bench_{}'.format(i)
+        attributes = {ATTR_UNIT_OF_MEASUREMENT: UNIT}
+        states = []
+        value = rnd.uniform(0, 100)
+        moment = start
+        while moment < end:
+            value += rnd.gauss(0, 1)
+            state = STATE_UNAVAILABLE if rnd.random() < args.gaps \
+                else str(round(value, 2))
+            states.append(State(entity_id, state, attributes, moment, moment))
+            moment += timedelta(seconds=rnd.expovariate(1 / args.rate))
+        history[entity_id] = states
+    return history
+
+
+def make_sensor(args, hass, entity_ids):
+    """Create average sensor with sliding window."""
+    statistics = {}
+    if args.statistics:
+        statistics = {
+            sensor.CONF_EMA_TIME_CONSTANT: timedelta(minutes=10),
+            sensor.CONF_MEDIAN: True,
+            sensor.CONF_PERCENTILES: [5, 95],
+        }
+    return sensor.AverageSensor(
+        hass, 'Benchmark', None, None, timedelta(hours=args.window),
+        entity_ids, 2, statistics=statistics)
+
+
+def run(args, history, clock, updates):
+    """Run one pass of initial load and incremental updates.
+
+    Return list of (wall time, fake history queries) of every update."""
+    fake_history = FakeHistory(history)
+    hass = SimpleNamespace(
+        data={},
+        states=FakeStates(history, clock),
+        config=SimpleNamespace(units=SimpleNamespace(
+            temperature_unit='°C')),
+        add_job=lambda *args: None,
+    )
+    hass.data[sensor.DOMAIN] = HistoryLoader(
+        hass, sensor.UPDATE_MIN_TIME.total_seconds())
+    hass.data[sensor.DATA_ROLLUPS] = RollupStore(hass)
+
+    entity = make_sensor(args, hass, list(history))
+    step = sensor.UPDATE_MIN_TIME
+    clock.now = args.begin
+    sensor._PERIODS_CACHE.clear()   # pylint: disable=protected-access
+
+    results = []
+    with mock.patch.object(loader, 'history', fake_history):
+        for _ in range(updates + 1):
+            queries = fake_history.queries
+            started = time.perf_counter()
+            # pylint: disable=protected-access
+            p_period = entity._period
+            entity._async_update_period()
+            entity._update_state(p_period)
+            results.append((time.perf_counter() - started,
+                            fake_history.queries - queries))
+            clock.now += step
+    return results
+
+
+def report(title, values, unit='s'):
+    """Print statistics of measured values."""
+    if not values:
+        return
+    values = sorted(values)
+    print('  {:<22} min {:>10.4f}{u}  median {:>10.4f}{u}  '
+          'max {:>10.4f}{u}'.format(
+              title, values[0], values[len(values) // 2], values[-1],
+              u=unit))
+
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--window', type=float, default=24,
+                        help='sliding window length in hours (default: 24)')
+    parser.add_argument('--rate', type=float, default=30,
+                        help='mean seconds between states (default: 30)')
+    parser.add_argument('--entities', type=int, default=5,
+                        help='number of source entities (default: 5)')
+    parser.add_argument('--gaps', type=float, default=0.01,
+                        help='part of unavailable states (default: 0.01)')
+    parser.add_argument('--updates', type=int, default=30,
+                        help='number of incremental updates (default: 30)')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='number of timed passes (default: 3)')
+    parser.add_argument('--statistics', action='store_true',
+                        help='also compute EMA, median and percentiles')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='random seed of synthetic history')
+    args = parser.parse_args()
+
+    step = sensor.UPDATE_MIN_TIME
+    first = dt_util.utc_from_timestamp(1546300800)  # 2019-01-01
+    args.begin = first + timedelta(hours=args.window)
+    last = args.begin + step * (args.updates + 1)
+    history = make_history(args, first, last)
+    total = sum(len(states) for states in history.values())
+    print('History: {} entities, {} states, window {:g}h, '
+          '{} incremental updates'.format(
+              args.entities, total, args.window, args.updates))
+
+    clock = Clock(args.begin)
+    with mock.patch.object(dt_util, 'utcnow', clock.utcnow):
+        initial, incremental = [], []
+        for _ in range(args.repeat):
+            gc.collect()
+            results = run(args, history, clock, args.updates)
+            initial.append(results[0][0])
+            incremental.extend(wall for wall, _ in results[1:])
+        queries = sum(q for _, q in results)
+
+        print('Wall time:')
+        report('initial load', initial)
+        report('incremental update', incremental)
+        print('  recorder queries per pass: {}'.format(queries))
+
+        gc.collect()
+        tracemalloc.start()
+        before = tracemalloc.take_snapshot()
+        run(args, history, clock, args.updates)
+        after = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    stats = after.compare_to(before, 'filename')
+    blocks = sum(stat.count_diff for stat in stats)
+    size = sum(stat.size_diff for stat in stats)
+    print('Memory:')
+    print('  retained allocations   {} blocks, {:.1f} KiB'.format(
+        blocks, size / 1024))
+    print('  peak traced memory     {:.1f} KiB'.format(peak / 1024))
+    for stat in stats[:5]:
+        print('    {}'.format(stat))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,266 @@
+#  Copyright (c) 2019, Andrey "Limych" Khrolenok <andrey@khrolenok.ru>
+#  Creative Commons BY-NC-SA 4.0 International Public License
+#  (see LICENSE.md or https://creativecommons.org/licenses/by-nc-sa/4.0/)
+
+"""
+Incremental time-weighted accumulator for the Average Sensor.
+
+For more details about this sensor, please refer to the documentation at
+https://github.com/Limych/ha-average/
+"""
+import math
+from collections import deque
+from itertools import islice
+from typing import Optional, Sequence
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+# Minimal batch size worth converting to arrays
+VECTORIZE_MIN_SAMPLES = 64
+
+
+def _sample_count(sample) -> int:
+    """Return number of states aggregated in the sample."""
+    return sample[2] if len(sample) > 2 else 1
+
+
+def _sample_min(sample) -> float:
+    """Return minimal value of states aggregated in the sample."""
+    return sample[3] if len(sample) > 2 else sample[1]
+
+
+def _sample_max(sample) -> float:
+    """Return maximal value of states aggregated in the sample."""
+    return sample[4] if len(sample) > 2 else sample[1]
+
+
+class TimeWeightedAccumulator:
+    """Running value×time integral of one entity's states in a window.
+
+    Each sample is a (timestamp, value) pair; its value holds until the next
+    sample's timestamp. Samples are appended as they arrive and expired from
+    the head when the window start moves forward, so every update costs
+    O(new samples) instead of O(window).
+
+    The head of the window can also hold pre-aggregated buckets
+    (timestamp, mean, count, min, max) restored from rollups.
+
+    Closed segments are also fed into optional streaming statistics.
+    """
+
+    def __init__(self, statistics=None):
+        """Initialize the accumulator."""
+        self.statistics = statistics
+        self._samples = deque()
+        self._integral = 0.0    # Sum of value * duration of closed segments
+        self._count = 0
+        self._min = self._max = None
+        self._extremes_dirty = False
+        self._expired = 0
+
+    def __len__(self) -> int:
+        """Return number of samples in the window."""
+        return len(self._samples)
+
+    @property
+    def count(self) -> int:
+        """Return number of states in the window."""
+        return self._count
+
+    @property
+    def start_timestamp(self) -> Optional[float]:
+        """Return timestamp of the first sample in the window."""
+        return self._samples[0][0] if self._samples else None
+
+    @property
+    def head_end_timestamp(self) -> Optional[float]:
+        """Return timestamp when the first sample is replaced by the next."""
+        return self._samples[1][0] if len(self._samples) > 1 else None
+
+    @property
+    def last_timestamp(self) -> Optional[float]:
+        """Return timestamp of the last sample in the window."""
+        return self._samples[-1][0] if self._samples else None
+
+    @property
+    def min_value(self) -> Optional[float]:
+        """Return minimal value in the window."""
+        if self._extremes_dirty:
+            self._update_extremes()
+        return self._min
+
+    @property
+    def max_value(self) -> Optional[float]:
+        """Return maximal value in the window."""
+        if self._extremes_dirty:
+            self._update_extremes()
+        return self._max
+
+    def clear(self):
+        """Forget all samples."""
+        self._samples.clear()
+        self._integral = 0.0
+        self._count = 0
+        self._min = self._max = None
+        self._extremes_dirty = False
+        self._expired = 0
+
+    def add(self, timestamp: float, value: float):
+        """Append a new sample to the tail of the window."""
+        self._append((timestamp, value), value, value)
+
+    def add_bucket(self, timestamp: float, value: float, count: int,
+                   min_value: float, max_value: float):
+        """Append a pre-aggregated bucket to the tail of the window."""
+        self._append((timestamp, value, count, min_value, max_value),
+                     min_value, max_value)
+
+    def _append(self, sample, min_value, max_value):
+        """Append a sample to the tail of the window."""
+        samples = self._samples
+        if samples:
+            last_ts, last_value = samples[-1][:2]
+            if sample[0] <= last_ts:
+                # Already accounted for
+                return
+            self._integral += last_value * (sample[0] - last_ts)
+            if self.statistics is not None:
+                self.statistics.add(last_value, sample[0] - last_ts)
+        samples.append(sample)
+        self._count += _sample_count(sample)
+
+        if not self._extremes_dirty:
+            if self._min is None:
+                self._min, self._max = min_value, max_value
+            else:
+                self._min = min(self._min, min_value)
+                self._max = max(self._max, max_value)
+
+    def extend(self, timestamps: Sequence[float], values: Sequence[float]):
+        """Append a batch of samples ordered by time to the tail of the window.
+
+        If NumPy is available, big batches are integrated in bulk."""
+        if np is None or len(timestamps) < VECTORIZE_MIN_SAMPLES:
+            for timestamp, value in zip(timestamps, values):
+                self.add(timestamp, value)
+            return
+
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        values = np.asarray(values, dtype=np.float64)
+
+        samples = self._samples
+        if samples:
+            last_ts, last_value = samples[-1][:2]
+            # Skip samples already accounted for
+            mask = timestamps > last_ts
+            timestamps = timestamps[mask]
+            values = values[mask]
+            if not timestamps.size:
+                return
+            self._integral += last_value * (float(timestamps[0]) - last_ts)
+            if self.statistics is not None:
+                self.statistics.add(
+                    last_value, float(timestamps[0]) - last_ts)
+
+        durations = np.diff(timestamps)
+        self._integral += float(np.dot(values[:-1], durations))
+        if self.statistics is not None:
+            for value, duration in zip(values[:-1].tolist(),
+                                       durations.tolist()):
+                self.statistics.add(value, duration)
+        samples.extend(zip(timestamps.tolist(), values.tolist()))
+        self._count += int(timestamps.size)
+
+        if not self._extremes_dirty:
+            min_value = float(values.min())
+            max_value = float(values.max())
+            if self._min is None:
+                self._min, self._max = min_value, max_value
+            else:
+                self._min = min(self._min, min_value)
+                self._max = max(self._max, max_value)
+
+    def expire(self, start_timestamp: float):
+        """Drop samples before the new window start and clip the head."""
+        samples = self._samples
+        expired = 0.0
+        while len(samples) > 1 and samples[1][0] <= start_timestamp:
+            sample = samples.popleft()
+            expired += samples[0][0] - sample[0]
+            self._integral -= sample[1] * (samples[0][0] - sample[0])
+            self._count -= _sample_count(sample)
+            self._expired += 1
+            if _sample_min(sample) == self._min \
+                    or _sample_max(sample) == self._max:
+                self._extremes_dirty = True
+
+        if samples and samples[0][0] < start_timestamp:
+            sample = samples[0]
+            if len(samples) > 1:
+                expired += start_timestamp - sample[0]
+                self._integral -= sample[1] * (start_timestamp - sample[0])
+            samples[0] = (start_timestamp,) + sample[1:]
+
+        if self.statistics is not None and expired \
+                and self.statistics.expire(expired):
+            self.statistics.rebuild(self._segments())
+
+        if self._expired > len(samples):
+            # Re-sum from scratch from time to time to cancel out
+            # the floating point drift of repeated subtractions
+            self._resum()
+
+    def average(self, end_timestamp: float) -> Optional[float]:
+        """Return time-weighted average of the window up to given time."""
+        if not self._samples:
+            return None
+
+        last_ts, last_value = self._samples[-1][:2]
+        elapsed = end_timestamp - self._samples[0][0]
+        if elapsed <= 0:
+            return last_value
+
+        integral = self._integral + last_value * max(
+            end_timestamp - last_ts, 0)
+        return integral / elapsed
+
+    def tail(self, end_timestamp: float) -> Optional[tuple]:
+        """Return (value, duration) of the open last segment."""
+        if not self._samples:
+            return None
+        last_ts, last_value = self._samples[-1][:2]
+        return last_value, max(end_timestamp - last_ts, 0)
+
+    def samples_since(self, timestamp: float) -> list:
+        """Return (timestamp, value) samples in effect since given time."""
+        result = []
+        for sample in reversed(self._samples):
+            result.append(sample[:2])
+            if sample[0] <= timestamp:
+                break
+        result.reverse()
+        return result
+
+    def _segments(self):
+        """Iterate over (value, duration) of closed segments."""
+        samples = self._samples
+        for sample, next_sample in zip(samples, islice(samples, 1, None)):
+            yield sample[1], next_sample[0] - sample[0]
+
+    def _resum(self):
+        """Recompute the integral of closed segments."""
+        self._integral = math.fsum(
+            value * duration for value, duration in self._segments())
+        self._expired = 0
+
+    def _update_extremes(self):
+        """Recompute min and max values after head expiration."""
+        if self._samples:
+            self._min = min(_sample_min(sample) for sample in self._samples)
+            self._max = max(_sample_max(sample) for sample in self._samples)
+        else:
+            self._min = self._max = None
+        self._extremes_dirty = False
@@ -0,0 +1,119 @@
+#  Copyright (c) 2019, Andrey "Limych" Khrolenok <andrey@khrolenok.ru>
+#  Creative Commons BY-NC-SA 4.0 International Public License
+#  (see LICENSE.md or https://creativecommons.org/licenses/by-nc-sa/4.0/)
+
+"""
+Batched recorder history loader for the Average Sensor.
+
+For more details about this sensor, please refer to the documentation at
+https://github.com/Limych/ha-average/
+"""
+import logging
+import threading
+import time
+from collections import defaultdict
+
+from homeassistant.components import history
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class _Batch:
+    """History of entities loaded for a period, possibly still loading."""
+
+    __slots__ = ('expires', 'entity_ids', 'loaded', 'states')
+
+    def __init__(self, expires, entity_ids):
+        """Initialize the batch."""
+        self.expires = expires
+        self.entity_ids = entity_ids
+        self.loaded = threading.Event()
+        self.states = None
+
+
+class HistoryLoader:
+    """Load history of source entities of all average sensors at once.
+
+    Sensors are grouped by their period definition. The first sensor of
+    a group requesting a period loads start states and state changes of all
+    group's entities with one recorder query; other sensors of the group are
+    served from memory. Concurrent requesters of a period being loaded wait
+    for that load; loads of different periods run in parallel.
+    """
+
+    def __init__(self, hass, cache_time: float):
+        """Initialize the loader."""
+        self._hass = hass
+        self._cache_time = cache_time
+        self._groups = defaultdict(set)
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def register(self, group, entity_ids):
+        """Register source entities of a sensor with given period."""
+        self._groups[group].update(entity_ids)
+
+    def get_history(self, group, start, end, entity_ids,
+                    include_start_state=False) -> dict:
+        """Return states of given entities during period grouped by entity.
+
+        If include_start_state is True, the state at period start is the
+        first item of every list."""
+        key = (start, end, include_start_state)
+        # Lock is held only to find or register the batch, not to load it
+        with self._lock:
+            now = time.monotonic()
+            self._cache = {
+                k: v for k, v in self._cache.items()
+                if v.expires > now or not v.loaded.is_set()
+            }
+
+            batch = self._cache.get(key)
+            owner = batch is None or not batch.entity_ids.issuperset(
+                entity_ids)
+            if owner:
+                entity_set = self._groups[group].union(entity_ids)
+                if batch is not None:
+                    entity_set |= batch.entity_ids
+                batch = self._cache[key] = _Batch(
+                    now + self._cache_time, frozenset(entity_set))
+
+        if owner:
+            try:
+                batch.states = self._load(
+                    start, end, batch.entity_ids, include_start_state)
+            finally:
+                if batch.states is None:
+                    with self._lock:
+                        if self._cache.get(key) is batch:
+                            del self._cache[key]
+                batch.loaded.set()
+        else:
+            batch.loaded.wait()
+            if batch.states is None:
+                # Load of other requester failed, try it again on our own
+                return self.get_history(
+                    group, start, end, entity_ids, include_start_state)
+
+        states = batch.states
+        return {
+            entity_id: states.get(entity_id, [])
+            for entity_id in entity_ids
+        }
+
+    def _load(self, start, end, entity_ids, include_start_state) -> dict:
+        """Load history of entities from the recorder."""
+        _LOGGER.debug('Loading history of %d entities from %s to %s',
+                      len(entity_ids), start, end)
+        states = history.get_significant_states(
+            self._hass, start, end, list(entity_ids),
+            include_start_time_state=include_start_state)
+
+        # Attributes only updates don't change entity state
+        return {
+            entity_id: [
+                item for item in items
+                if item.last_changed == item.last_updated
+            ]
+            for entity_id, items in states.items()
+        }
@@ -0,0 +1,165 @@
+#  Copyright (c) 2019, Andrey "Limych" Khrolenok <andrey@khrolenok.ru>
+#  Creative Commons BY-NC-SA 4.0 International Public License
+#  (see LICENSE.md or https://creativecommons.org/licenses/by-nc-sa/4.0/)
+
+"""
+Persistent rollups of source entities for the Average Sensor.
+
+For more details about this sensor, please refer to the documentation at
+https://github.com/Limych/ha-average/
+"""
+import logging
+import math
+import threading
+from bisect import bisect_left
+
+from homeassistant.core import callback
+from homeassistant.helpers.storage import Store
+
+_LOGGER = logging.getLogger(__name__)
+
+STORAGE_KEY = 'average.rollups'
+STORAGE_VERSION = 1
+
+ROLLUP_INTERVAL = 60    # Seconds per bucket
+ROLLUP_SETTLE_TIME = 60     # Seconds to wait for late states before sealing
+SAVE_DELAY = 300
+
+
+class RollupStore:
+    """Per-entity per-minute buckets of source entities states kept on disk.
+
+    Every bucket is a [timestamp, integral, seconds, count, min, max] list,
+    where integral is a sum of value×time for the covered seconds of
+    the minute. Long windows are restored after restart from the buckets
+    plus a short tail of raw history instead of replaying the recorder.
+    """
+
+    def __init__(self, hass):
+        """Initialize the store."""
+        self._hass = hass
+        self._store = Store(hass, STORAGE_VERSION, STORAGE_KEY)
+        self._data = {}
+        self._lock = threading.Lock()
+        self._save_pending = False
+
+    async def async_load(self):
+        """Load rollups from disk."""
+        data = await self._store.async_load()
+        if data:
+            self._data = data
+
+    def get(self, entity_id, start_timestamp, end_timestamp):
+        """Return buckets of entity covering the window start and time they
+        are sealed up to. Return (None, None) if rollups can't be used."""
+        with self._lock:
+            entry = self._data.get(entity_id)
+            if entry is None or not (
+                    entry['first'] <= start_timestamp
+                    < entry['last'] <= end_timestamp
+            ):
+                return None, None
+
+            buckets = entry['buckets']
+            i = bisect_left(buckets, [start_timestamp - ROLLUP_INTERVAL])
+            return buckets[i:], entry['last']
+
+    def record(self, entity_id, acc, end_timestamp, window):
+        """Seal buckets of entity up to given time from accumulated samples.
+
+        Window is the length of the period used by the sensor; buckets older
+        than the longest window of the entity are dropped. Buckets are kept
+        over a gap between rollups and samples, as sensors with longer
+        windows may still need them."""
+        start_timestamp = acc.start_timestamp
+        if start_timestamp is None:
+            return
+
+        seal_timestamp = math.floor(
+            (end_timestamp - ROLLUP_SETTLE_TIME) / ROLLUP_INTERVAL
+        ) * ROLLUP_INTERVAL
+
+        with self._lock:
+            entry = self._data.get(entity_id)
+            if entry is None:
+                first = math.ceil(
+                    start_timestamp / ROLLUP_INTERVAL) * ROLLUP_INTERVAL
+                entry = self._data[entity_id] = {
+                    'first': first,
+                    'last': first,
+                    'keep': window,
+                    'buckets': [],
+                }
+            entry['keep'] = max(entry['keep'], window)
+            if seal_timestamp <= entry['last']:
+                return
+
+            entry['buckets'].extend(self._make_buckets(
+                acc.samples_since(entry['last']),
+                entry['last'], seal_timestamp))
+            entry['last'] = seal_timestamp
+            self._prune(entry, end_timestamp)
+
+        self._hass.add_job(self._async_schedule_save)
+
+    @staticmethod
+    def _make_buckets(samples, start_timestamp, end_timestamp) -> list:
+        """Aggregate samples into buckets in given time range."""
+        buckets = []
+        bucket = None
+        for i, (timestamp, value) in enumerate(samples):
+            seg_start = max(timestamp, start_timestamp)
+            seg_end = samples[i + 1][0] if i + 1 < len(samples) \
+                else end_timestamp
+            seg_end = min(seg_end, end_timestamp)
+            # Count states in the buckets they were started in only
+            counted = timestamp < start_timestamp
+
+            while seg_start < seg_end:
+                bucket_ts = math.floor(
+                    seg_start / ROLLUP_INTERVAL) * ROLLUP_INTERVAL
+                part_end = min(seg_end, bucket_ts + ROLLUP_INTERVAL)
+                if bucket is None or bucket[0] != bucket_ts:
+                    bucket = [bucket_ts, 0.0, 0.0, 0, value, value]
+                    buckets.append(bucket)
+                bucket[1] += value * (part_end - seg_start)
+                bucket[2] += part_end - seg_start
+                if not counted:
+                    bucket[3] += 1
+                    counted = True
+                bucket[4] = min(bucket[4], value)
+                bucket[5] = max(bucket[5], value)
+                seg_start = part_end
+
+        return buckets
+
+    @staticmethod
+    def _prune(entry, now_timestamp):
+        """Drop buckets not needed by any window anymore."""
+        buckets = entry['buckets']
+        i = bisect_left(
+            buckets, [now_timestamp - entry['keep'] - ROLLUP_INTERVAL])
+        if i:
+            del buckets[:i]
+            entry['first'] = buckets[0][0] if buckets else entry['last']
+
+    @callback
+    def _async_schedule_save(self):
+        """Schedule saving rollups to disk.
+
+        Store restarts its delay on every call, so the save is scheduled
+        only once until it is done; otherwise it would never happen."""
+        if self._save_pending:
+            return
+        self._save_pending = True
+        self._store.async_delay_save(self._data_to_save, SAVE_DELAY)
+
+    @callback
+    def _data_to_save(self):
+        """Return snapshot of rollups to store."""
+        self._save_pending = False
+        with self._lock:
+            return {
+                entity_id: dict(entry, buckets=list(entry['buckets']))
+                for entity_id, entry in self._data.items()
+            }
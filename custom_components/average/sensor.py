@@ -8,15 +8,15 @@ The Average Sensor.
 For more details about this sensor, please refer to the documentation at
 https://github.com/Limych/ha-average/
 """
-import datetime
+import asyncio
 import logging
 import math
 import numbers
+from collections import defaultdict
 from datetime import timedelta
 
 import homeassistant.util.dt as dt_util
 import voluptuous as vol
-from homeassistant.components import history
 from homeassistant.components.climate import ClimateDevice
 from homeassistant.components.water_heater import WaterHeaterDevice
 from homeassistant.components.weather import WeatherEntity
@@ -30,13 +30,21 @@ from homeassistant.exceptions import TemplateError
 from homeassistant.helpers import config_validation as cv
 from homeassistant.helpers.config_validation import PLATFORM_SCHEMA
 from homeassistant.helpers.entity import Entity
-from homeassistant.helpers.event import async_track_state_change
+from homeassistant.helpers.event import (
+    async_track_state_change, async_track_point_in_utc_time)
 from homeassistant.util import Throttle
 from homeassistant.util.temperature import convert as convert_temperature
 
+from .accumulator import TimeWeightedAccumulator
+from .loader import HistoryLoader
+from .rollup import RollupStore
+from .sketch import StreamingStatistics, combined_quantiles
+
 _LOGGER = logging.getLogger(__name__)
 
 # Base component constants
+DOMAIN = 'average'
+DATA_ROLLUPS = 'average_rollups'
 VERSION = '1.4.2'
 ISSUE_URL = "https://github.com/Limych/ha-average/issues"
 
@@ -44,6 +52,10 @@ CONF_START = 'start'
 CONF_END = 'end'
 CONF_DURATION = 'duration'
 CONF_PRECISION = 'precision'
+CONF_EVENT_DRIVEN = 'event_driven'
+CONF_EMA_TIME_CONSTANT = 'ema_time_constant'
+CONF_MEDIAN = 'median'
+CONF_PERCENTILES = 'percentiles'
 CONF_PERIOD_KEYS = [CONF_START, CONF_END, CONF_DURATION]
 
 DEFAULT_NAME = 'Average'
@@ -55,6 +67,9 @@ ATTR_AVAILABLE_SOURCES = 'available_sources'
 ATTR_COUNT = 'count'
 ATTR_MIN_VALUE = 'min_value'
 ATTR_MAX_VALUE = 'max_value'
+ATTR_EMA = 'ema'
+ATTR_MEDIAN = 'median'
+ATTR_PERCENTILE = 'percentile_{:g}'
 
 ATTR_TO_PROPERTY = [
     ATTR_START,
@@ -64,9 +79,39 @@ ATTR_TO_PROPERTY = [
     ATTR_COUNT,
     ATTR_MAX_VALUE,
     ATTR_MIN_VALUE,
+    ATTR_EMA,
+    ATTR_MEDIAN,
 ]
 
+# Periods are aligned to update ticks of this length, so sensors sharing
+# a period definition share history queries. The end of a period ending now
+# lags real time by up to one tick.
 UPDATE_MIN_TIME = timedelta(seconds=20)
+EVENT_MAX_INTERVAL = timedelta(minutes=10)
+# States changed right before a query may be not committed by recorder yet,
+# so the history tail is reloaded with such an overlap
+RECORDER_COMMIT_LAG = timedelta(seconds=5)
+
+
+class TickCache(dict):
+    """Process-wide cache of values valid during one update tick."""
+
+    def __init__(self):
+        """Initialize the cache."""
+        super().__init__()
+        self.tick = None
+
+    def get_tick(self, tick, key):
+        """Return cached value for the tick, forget all older ticks."""
+        if tick != self.tick:
+            self.clear()
+            self.tick = tick
+        return self.get(key)
+
+
+# Rendered period templates and resolved periods shared between sensors
+_TEMPLATES_CACHE = TickCache()
+_PERIODS_CACHE = TickCache()
 
 
 def check_period_keys(conf):
@@ -89,6 +134,11 @@ PLATFORM_SCHEMA = vol.All(
         vol.Optional(CONF_END): cv.template,
         vol.Optional(CONF_DURATION): cv.time_period,
         vol.Optional(CONF_PRECISION, default=2): int,
+        vol.Optional(CONF_EVENT_DRIVEN, default=False): cv.boolean,
+        vol.Optional(CONF_EMA_TIME_CONSTANT): cv.time_period,
+        vol.Optional(CONF_MEDIAN, default=False): cv.boolean,
+        vol.Optional(CONF_PERCENTILES, default=[]): vol.All(
+            cv.ensure_list, [vol.All(vol.Coerce(float), vol.Range(0, 100))]),
     }),
     check_period_keys,
 )
@@ -109,20 +159,35 @@ async def async_setup_platform(hass, config, async_add_entities,
     duration = config.get(CONF_DURATION)
     entities = config.get(CONF_ENTITIES)
     precision = config.get(CONF_PRECISION)
+    event_driven = config.get(CONF_EVENT_DRIVEN)
+    statistics = {
+        CONF_EMA_TIME_CONSTANT: config.get(CONF_EMA_TIME_CONSTANT),
+        CONF_MEDIAN: config.get(CONF_MEDIAN),
+        CONF_PERCENTILES: config.get(CONF_PERCENTILES),
+    }
 
     for template in [start, end]:
         if template is not None:
             template.hass = hass
 
+    if DOMAIN not in hass.data:
+        hass.data[DOMAIN] = HistoryLoader(
+            hass, UPDATE_MIN_TIME.total_seconds())
+    if DATA_ROLLUPS not in hass.data:
+        hass.data[DATA_ROLLUPS] = RollupStore(hass)
+        await hass.data[DATA_ROLLUPS].async_load()
+
     async_add_entities(
-        [AverageSensor(hass, name, start, end, duration, entities, precision)])
+        [AverageSensor(hass, name, start, end, duration, entities, precision,
+                       event_driven, statistics)])
 
 
 class AverageSensor(Entity):    # pylint: disable=r0902
     """Implementation of an Average sensor."""
 
     def __init__(self, hass, name: str, start, end, duration, entity_ids: list, # pylint: disable=r0913
-                 precision: int):
+                 precision: int, event_driven: bool = False,
+                 statistics: dict = None):
         """Initialize the sensor."""
         self._hass = hass
         self._name = name
@@ -132,6 +197,11 @@ class AverageSensor(Entity):    # pylint: disable=r0902
         self._period = self.start = self.end = None
         self._entity_ids = entity_ids
         self._precision = precision
+        self._event_driven = event_driven
+        self._wake_time = self._wake_unsub = None
+        self._head_expiry = None
+        self._update_lock = None
+        self._update_pending = False
         self._state = None
         self._unit_of_measurement = None
         self._icon = None
@@ -140,6 +210,29 @@ class AverageSensor(Entity):    # pylint: disable=r0902
         self.available_sources = 0
         self.count = 0
         self.min_value = self.max_value = None
+        self.ema = self.median = None
+        self.percentiles = {}
+        self._accumulators = {}
+        # Sources with current state used instead of missing history
+        self._estimated = set()
+
+        statistics = statistics or {}
+        ema_time_constant = statistics.get(CONF_EMA_TIME_CONSTANT)
+        self._ema_time_constant = None if ema_time_constant is None \
+            else ema_time_constant.total_seconds()
+        self._median = statistics.get(CONF_MEDIAN, False)
+        self._percentiles = statistics.get(CONF_PERCENTILES) or []
+
+        # Sensors with the same period definition share history queries
+        self._group = (
+            getattr(start, 'template', None),
+            getattr(end, 'template', None),
+            duration,
+        )
+        self._loader = hass.data[DOMAIN]
+        self._rollups = hass.data[DATA_ROLLUPS]
+        if self._has_period:
+            self._loader.register(self._group, entity_ids)
 
     @property
     def _has_period(self) -> bool:
@@ -152,7 +245,7 @@ class AverageSensor(Entity):    # pylint: disable=r0902
     @property
     def should_poll(self):
         """Return the polling state."""
-        return self._has_period
+        return self._has_period and not self._event_driven
 
     @property
     def name(self):
@@ -182,25 +275,37 @@ class AverageSensor(Entity):    # pylint: disable=r0902
             for attr in ATTR_TO_PROPERTY
             if getattr(self, attr) is not None
         }
+        state_attr.update(self.percentiles)
         return state_attr
 
     async def async_added_to_hass(self):
         """Register callbacks."""
+        self._update_lock = asyncio.Lock()
 
         # pylint: disable=unused-argument
         @callback
         def sensor_state_listener(entity, old_state, new_state):
             """Handle device state changes."""
-            last_state = self._state
-            self._update_state()
-            if last_state != self._state:
-                self.async_schedule_update_ha_state(True)
+            # Changes of several sources at once are handled together
+            if not self._update_pending:
+                self._update_pending = True
+                self._hass.async_create_task(self._async_state_changed())
+
+        # pylint: disable=unused-argument
+        @callback
+        def sensor_event_listener(entity, old_state, new_state):
+            """Recompute state at the next update tick."""
+            self._async_schedule_wake(self._next_tick())
 
         # pylint: disable=unused-argument
         @callback
         def sensor_startup(event):
             """Update template on startup."""
-            if self._has_period:
+            if self._has_period and self._event_driven:
+                async_track_state_change(self._hass, self._entity_ids,
+                                         sensor_event_listener)
+                self._hass.async_create_task(self._async_event_update())
+            elif self._has_period:
                 self.async_schedule_update_ha_state(True)
             else:
                 async_track_state_change(self._hass, self._entity_ids,
@@ -210,6 +315,78 @@ class AverageSensor(Entity):    # pylint: disable=r0902
         self._hass.bus.async_listen_once(EVENT_HOMEASSISTANT_START,
                                          sensor_startup)
 
+    @staticmethod
+    def _next_tick():
+        """Return start time of the next update tick."""
+        step = UPDATE_MIN_TIME.total_seconds()
+        return dt_util.utc_from_timestamp(
+            (math.floor(dt_util.utcnow().timestamp() / step) + 1) * step)
+
+    @callback
+    def _async_schedule_wake(self, when):
+        """Schedule recompute of event driven sensor at given time."""
+        if self._wake_unsub is not None:
+            if self._wake_time <= when:
+                return
+            self._wake_unsub()
+
+        self._wake_time = when
+        self._wake_unsub = async_track_point_in_utc_time(
+            self._hass, self._async_event_update, when)
+
+    async def _async_state_changed(self):
+        """Recompute state after sources changes."""
+        self._update_pending = False
+        last_state = self._state
+        await self._async_update_state()
+        if last_state != self._state:
+            self.async_schedule_update_ha_state()
+
+    async def _async_event_update(self, *_):
+        """Recompute state of event driven sensor."""
+        self._wake_unsub = None
+        await self._async_state_changed()
+        self._async_schedule_wake(self._next_wake_time())
+
+    def _next_wake_time(self):
+        """Return time when the state should be recomputed without
+        any source changes."""
+        wake = dt_util.utcnow() + EVENT_MAX_INTERVAL
+        if self._head_expiry is not None:
+            wake = min(wake, dt_util.utc_from_timestamp(self._head_expiry))
+        return max(wake, self._next_tick())
+
+    def _update_head_expiry(self):
+        """Find when the sliding window drops its oldest state."""
+        self._head_expiry = None
+        if self._start_template is not None or self._period is None:
+            return
+
+        start, end = self._period
+        window = (end - start).total_seconds()
+        for acc in self._accumulators.values():
+            head_end = acc.head_end_timestamp
+            if head_end is not None and (
+                    self._head_expiry is None
+                    or head_end + window < self._head_expiry
+            ):
+                self._head_expiry = head_end + window
+
+    @property
+    def _has_statistics(self) -> bool:
+        """Return True if any streaming statistics are configured."""
+        return \
+            self._ema_time_constant is not None \
+            or self._median \
+            or bool(self._percentiles)
+
+    def _new_accumulator(self):
+        """Return new accumulator for states of a source entity."""
+        if not self._has_statistics:
+            return TimeWeightedAccumulator()
+        return TimeWeightedAccumulator(
+            StreamingStatistics(self._ema_time_constant))
+
     @staticmethod
     def _has_state(state) -> bool:
         """Return True if state has any value."""
@@ -254,20 +431,26 @@ class AverageSensor(Entity):    # pylint: disable=r0902
 
         return temperature
 
-    def _get_entity_state(self, entity):
-        """Return current state of given entity
-        and count some sensor attributes."""
+    def _get_entity_value(self, entity):
+        """Return current state of given entity as float."""
         state = self._get_temperature(entity) if self._temperature_mode \
             else entity.state
         if not self._has_state(state):
             return None
 
         try:
-            state = float(state)
+            return float(state)
         except ValueError:
             _LOGGER.error('Could not convert value "%s" to float', state)
             return None
 
+    def _get_entity_state(self, entity):
+        """Return current state of given entity
+        and count some sensor attributes."""
+        state = self._get_entity_value(entity)
+        if state is None:
+            return None
+
         self.count += 1
         rstate = round(state, self._precision)
         if self.min_value is None:
@@ -278,10 +461,22 @@ class AverageSensor(Entity):    # pylint: disable=r0902
         return state
 
     @Throttle(UPDATE_MIN_TIME)
-    def update(self):
+    async def async_update(self):
         """Update the sensor state if it needed."""
         if self._has_period:
-            self._update_state()
+            await self._async_update_state()
+
+    async def _async_update_state(self):
+        """Update the sensor state without blocking the event loop.
+
+        Templates are rendered in the event loop, recorder queries and
+        states integration are done in the executor."""
+        async with self._update_lock:
+            p_period = self._period
+            if self._has_period:
+                self._async_update_period()
+            await self._hass.async_add_executor_job(
+                self._update_state, p_period)
 
     @staticmethod
     def handle_template_exception(ex, field):
@@ -294,56 +489,80 @@ class AverageSensor(Entity):    # pylint: disable=r0902
         _LOGGER.error("Error parsing template for field %s", field)
         _LOGGER.error(ex)
 
-    def _update_period(self):   # pylint: disable=r0912
+    @callback
+    def _async_render_datetime(self, template, field, tick):
+        """Render the template and parse its result as datetime.
+
+        Results are shared between all sensors during an update tick."""
+        key = template.template
+        result = _TEMPLATES_CACHE.get_tick(tick, key)
+        if result is not None:
+            return result
+
+        try:
+            rendered = template.async_render()
+        except (TemplateError, TypeError) as ex:
+            self.handle_template_exception(ex, field)
+            return None
+        result = dt_util.parse_datetime(rendered)
+        if result is None:
+            try:
+                result = dt_util.as_local(
+                    dt_util.utc_from_timestamp(math.floor(
+                        float(rendered)
+                    ))
+                )
+            except ValueError:
+                _LOGGER.error(
+                    "Parsing error: %s must be a datetime "
+                    "or a timestamp", field
+                )
+                return None
+
+        _TEMPLATES_CACHE[key] = result
+        return result
+
+    @callback
+    def _async_update_period(self):
         """Parse the templates and calculate a datetime tuples."""
+        # Align current time to update ticks, so sensors sharing a period
+        # definition request history for exactly the same period. States
+        # changed after the tick start are counted from the next tick on.
+        step = UPDATE_MIN_TIME.total_seconds()
+        tick = math.floor(dt_util.utcnow().timestamp() / step)
+
+        period = _PERIODS_CACHE.get_tick(tick, self._group)
+        if period is None:
+            period = self._async_calculate_period(tick, dt_util.as_local(
+                dt_util.utc_from_timestamp(tick * step)))
+            if period is None:
+                return
+            _PERIODS_CACHE[self._group] = period
+
+        start, end = self._period = period
+        self.start = start.replace(microsecond=0).isoformat()
+        self.end = end.replace(microsecond=0).isoformat()
+
+    @callback
+    def _async_calculate_period(self, tick, now):
+        """Calculate a datetime tuple of period at given time."""
         start = end = None
-        now = dt_util.now()
 
         # Parse start
         _LOGGER.debug('Process start template: %s', self._start_template)
         if self._start_template is not None:
-            try:
-                start_rendered = self._start_template.render()
-            except (TemplateError, TypeError) as ex:
-                self.handle_template_exception(ex, "start")
-                return
-            start = dt_util.parse_datetime(start_rendered)
+            start = self._async_render_datetime(
+                self._start_template, "start", tick)
             if start is None:
-                try:
-                    start = dt_util.as_local(
-                        dt_util.utc_from_timestamp(math.floor(
-                            float(start_rendered)
-                        ))
-                    )
-                except ValueError:
-                    _LOGGER.error(
-                        "Parsing error: start must be a datetime"
-                        "or a timestamp"
-                    )
-                    return
+                return None
 
         # Parse end
         _LOGGER.debug('Process end template: %s', self._end_template)
         if self._end_template is not None:
-            try:
-                end_rendered = self._end_template.render()
-            except (TemplateError, TypeError) as ex:
-                self.handle_template_exception(ex, "end")
-                return
-            end = dt_util.parse_datetime(end_rendered)
+            end = self._async_render_datetime(
+                self._end_template, "end", tick)
             if end is None:
-                try:
-                    end = dt_util.as_local(
-                        dt_util.utc_from_timestamp(math.floor(
-                            float(end_rendered)
-                        ))
-                    )
-                except ValueError:
-                    _LOGGER.error(
-                        "Parsing error: end must be a datetime "
-                        "or a timestamp"
-                    )
-                    return
+                return None
 
         # Calculate start or end using the duration
         _LOGGER.debug('Process duration: %s', self._duration)
@@ -357,30 +576,26 @@ class AverageSensor(Entity):    # pylint: disable=r0902
 
         _LOGGER.debug('Start: %s, End: %s', start, end)
         if start is None or end is None:
-            return
+            return None
 
         if start > now:
             # History hasn't been written yet for this period
-            return
+            return None
         if now < end:
             # No point in making stats of the future
             end = now
 
-        self._period = start, end
-        self.start = start.replace(microsecond=0).isoformat()
-        self.end = end.replace(microsecond=0).isoformat()
+        return start, end
 
-    def _update_state(self):    # pylint: disable=r0914,r0912,r0915
-        """Update the sensor state."""
+    # pylint: disable=r0914,r0912,r0915
+    def _update_state(self, p_period=None):
+        """Update the sensor state from period calculated before."""
         _LOGGER.debug('Updating sensor "%s"', self.name)
-        start = end = start_ts = end_ts = None
-        p_period = self._period
-
-        # Parse templates
-        self._update_period()
+        start = end = start_ts = end_ts = p_end = None
+        incremental = False
 
         if self._period is not None:
-            now = datetime.datetime.now()
+            now = dt_util.utcnow()
             start, end = self._period
             if p_period is None:
                 p_start = p_end = now
@@ -409,12 +624,49 @@ class AverageSensor(Entity):    # pylint: disable=r0902
                 # Don't compute anything as the value cannot have changed
                 return
 
+            # If period only moved forward, just the new tail of history
+            # has to be loaded into accumulators
+            incremental = (
+                p_period is not None
+                and p_start_ts <= start_ts <= p_end_ts <= end_ts
+            )
+
         self.available_sources = 0
         values = []
         self.count = 0
         self.min_value = self.max_value = None
 
-        for entity_id in self._entity_ids:  # pylint: disable=r1702
+        if self._period is not None:
+            # Load history of all sources at once
+            rebuild = {
+                entity_id for entity_id in self._entity_ids
+                if not incremental or entity_id not in self._accumulators
+            }
+
+            # Long windows are restored from rollups plus a short raw tail
+            rollups = {}
+            raw_starts = defaultdict(list)
+            for entity_id in self._entity_ids:
+                if entity_id not in rebuild:
+                    continue
+                buckets, sealed = self._rollups.get(
+                    entity_id, start_ts, end_ts)
+                if buckets is None:
+                    raw_starts[start].append(entity_id)
+                else:
+                    rollups[entity_id] = buckets
+                    raw_starts[dt_util.utc_from_timestamp(sealed)].append(
+                        entity_id)
+
+            history_list = {}
+            for raw_start, entity_ids in raw_starts.items():
+                history_list.update(self._get_history(
+                    raw_start, end, entity_ids, include_start_state=True))
+            history_list.update(self._get_history(
+                p_end - RECORDER_COMMIT_LAG, end,
+                [e for e in self._entity_ids if e not in rebuild]))
+
+        for entity_id in self._entity_ids:
             _LOGGER.debug('Processing entity "%s"', entity_id)
 
             entity = self._hass.states.get(entity_id)
@@ -435,60 +687,42 @@ class AverageSensor(Entity):    # pylint: disable=r0902
                     self._icon = \
                         entity.attributes.get(ATTR_ICON)
 
-            value = 0
-            elapsed = 0
-
             if self._period is None:
                 # Get current state
                 value = self._get_entity_state(entity)
                 _LOGGER.debug('Current state: %s', value)
 
             else:
-                # Get history between start and now
-                history_list = history.state_changes_during_period(
-                    self.hass, start, end, str(entity_id))
-
-                if entity_id not in history_list.keys():
-                    value = self._get_entity_state(entity)
-                    _LOGGER.warning(
-                        'Historical data not found for entity "%s". '
-                        'Current state used: %s', entity_id, value)
+                states = history_list.get(entity_id, [])
+                if entity_id in rebuild:
+                    acc = self._accumulators[entity_id] = \
+                        self._new_accumulator()
+                    self._estimated.discard(entity_id)
+                    for bucket in rollups.get(entity_id, []):
+                        acc.add_bucket(bucket[0], bucket[1] / bucket[2],
+                                       *bucket[3:])
+                    acc.expire(start_ts)
+                    self._load_states(acc, states)
+                    if not acc:
+                        value = self._get_entity_value(entity)
+                        _LOGGER.warning(
+                            'Historical data not found for entity "%s". '
+                            'Current state used: %s', entity_id, value)
+                        if value is not None:
+                            acc.add(start_ts, value)
+                            self._estimated.add(entity_id)
                 else:
-                    # Get the first state
-                    item = history.get_state(self.hass, start, entity_id)
-                    _LOGGER.debug('Initial historical state: %s', item)
-                    last_state = None
-                    last_time = start_ts
-                    if (
-                            item is not None
-                            and self._has_state(item.state)
-                    ):
-                        last_state = self._get_entity_state(item)
-
-                    # Get the other states
-                    for item in history_list.get(entity_id):
-                        _LOGGER.debug('Historical state: %s', item)
-                        if self._has_state(item.state):
-                            current_state = self._get_entity_state(item)
-                            current_time = item.last_changed.timestamp()
-
-                            if last_state:
-                                last_elapsed = current_time - last_time
-                                value += last_state * last_elapsed
-                                elapsed += last_elapsed
-
-                            last_state = current_state
-                            last_time = current_time
-
-                    # Count time elapsed between last history state and now
-                    if last_state:
-                        last_elapsed = end_ts - last_time
-                        value += last_state * last_elapsed
-                        elapsed += last_elapsed
-
-                    if elapsed:
-                        value /= elapsed
-                    _LOGGER.debug('Historical average state: %s', value)
+                    acc = self._accumulators[entity_id]
+                    self._load_states(acc, states)
+                    acc.expire(start_ts)
+
+                if entity_id not in self._estimated:
+                    # Don't store current state used as it was history
+                    self._rollups.record(
+                        entity_id, acc, end_ts, end_ts - start_ts)
+                value = acc.average(end_ts)
+                self._count_accumulator(acc)
+                _LOGGER.debug('Historical average state: %s', value)
 
             if isinstance(value, numbers.Number):
                 values.append(value)
@@ -499,3 +733,95 @@ class AverageSensor(Entity):    # pylint: disable=r0902
         else:
             self._state = None
         _LOGGER.debug('Total average state: %s', self._state)
+
+        self._update_statistics(end_ts)
+
+        if self._event_driven:
+            self._update_head_expiry()
+
+    def _update_statistics(self, end_ts):
+        """Compute streaming statistics of all sources in the period."""
+        self.ema = self.median = None
+        self.percentiles = {}
+        if self._period is None or not self._has_statistics:
+            return
+
+        accumulators = [
+            self._accumulators[entity_id] for entity_id in self._entity_ids
+            if self._accumulators.get(entity_id)
+        ]
+        if not accumulators:
+            return
+
+        if self._ema_time_constant is not None:
+            emas = [
+                acc.statistics.ema(acc.tail(end_ts)) for acc in accumulators
+            ]
+            emas = [value for value in emas if value is not None]
+            if emas:
+                self.ema = round(sum(emas) / len(emas), self._precision)
+
+        quantiles = [p / 100 for p in self._percentiles]
+        if self._median:
+            quantiles.append(0.5)
+        if not quantiles:
+            return
+
+        values = combined_quantiles(
+            [acc.statistics.digest for acc in accumulators],
+            [acc.tail(end_ts) for acc in accumulators],
+            quantiles)
+        if values is None:
+            return
+
+        values = [round(value, self._precision) for value in values]
+        if self._median:
+            self.median = values.pop()
+        self.percentiles = {
+            ATTR_PERCENTILE.format(percentile): value
+            for percentile, value in zip(self._percentiles, values)
+        }
+
+    def _get_history(self, start, end, entity_ids,
+                     include_start_state=False) -> dict:
+        """Return states of entities during period grouped by entity."""
+        if not entity_ids:
+            return {}
+
+        return self._loader.get_history(
+            self._group, start, end, entity_ids, include_start_state)
+
+    def _load_states(self, acc, states):
+        """Feed historical states of entity into accumulator."""
+        if not self._temperature_mode:
+            # Fast path: convert all states at once
+            states = [item for item in states if self._has_state(item.state)]
+            try:
+                values = list(map(float, [item.state for item in states]))
+            except ValueError:
+                pass    # Process states one by one to report the bad one
+            else:
+                acc.extend([
+                    item.last_changed.timestamp() for item in states
+                ], values)
+                return
+
+        for item in states:
+            _LOGGER.debug('Historical state: %s', item)
+            value = self._get_entity_value(item)
+            if value is not None:
+                acc.add(item.last_changed.timestamp(), value)
+
+    def _count_accumulator(self, acc):
+        """Count some sensor attributes of accumulated states."""
+        if not acc:
+            return
+
+        self.count += acc.count
+        min_value = round(acc.min_value, self._precision)
+        max_value = round(acc.max_value, self._precision)
+        if self.min_value is None:
+            self.min_value, self.max_value = min_value, max_value
+        else:
+            self.min_value = min(self.min_value, min_value)
+            self.max_value = max(self.max_value, max_value)
@@ -0,0 +1,165 @@
+#  Copyright (c) 2019, Andrey "Limych" Khrolenok <andrey@khrolenok.ru>
+#  Creative Commons BY-NC-SA 4.0 International Public License
+#  (see LICENSE.md or https://creativecommons.org/licenses/by-nc-sa/4.0/)
+
+"""
+Streaming statistics for the Average Sensor.
+
+For more details about this sensor, please refer to the documentation at
+https://github.com/Limych/ha-average/
+"""
+import math
+from bisect import insort
+from typing import Iterable, Optional, Tuple
+
+DEFAULT_COMPRESSION = 100
+
+# Part of expired weight in a digest which forces it to be rebuilt
+STALE_RATIO = 0.05
+
+
+class TDigest:
+    """Merging t-digest of weighted values.
+
+    Keeps at most about compression centroids whatever number of values was
+    added, so quantiles are estimated in bounded memory.
+    """
+
+    def __init__(self, compression: int = DEFAULT_COMPRESSION):
+        """Initialize the digest."""
+        self._compression = compression
+        self._centroids = []
+        self._buffer = []
+        self.total = 0.0
+
+    def add(self, value: float, weight: float = 1.0):
+        """Add weighted value to the digest."""
+        if weight <= 0:
+            return
+        self._buffer.append((value, weight))
+        self.total += weight
+        if len(self._buffer) >= 5 * self._compression:
+            self._merge()
+
+    def centroids(self) -> list:
+        """Return (mean, weight) centroids sorted by mean."""
+        if self._buffer:
+            self._merge()
+        return self._centroids
+
+    def _k_limit(self, quantile: float) -> float:
+        """Return maximal quantile of a centroid started at given one."""
+        scale = self._compression / (2 * math.pi)
+        k = scale * math.asin(2 * quantile - 1) + 1
+        if k >= scale * math.pi / 2:
+            return 1.0
+        return (math.sin(k / scale) + 1) / 2
+
+    def _merge(self):
+        """Merge buffered values into centroids."""
+        points = sorted(self._centroids + self._buffer)
+        self._buffer = []
+
+        merged = []
+        passed = 0.0
+        mean, weight = points[0]
+        limit = self._k_limit(0.0)
+        for p_mean, p_weight in points[1:]:
+            if (passed + weight + p_weight) / self.total <= limit:
+                weight += p_weight
+                mean += (p_mean - mean) * p_weight / weight
+            else:
+                merged.append((mean, weight))
+                passed += weight
+                limit = self._k_limit(passed / self.total)
+                mean, weight = p_mean, p_weight
+        merged.append((mean, weight))
+        self._centroids = merged
+
+    @staticmethod
+    def quantiles(centroids: list, quantiles: Iterable[float]) -> list:
+        """Estimate quantiles from sorted (mean, weight) centroids."""
+        total = sum(weight for _, weight in centroids)
+        result = []
+        for quantile in quantiles:
+            target = quantile * total
+            passed = 0.0
+            value = centroids[-1][0]
+            for i, (mean, weight) in enumerate(centroids):
+                if passed + weight / 2 >= target:
+                    if i == 0:
+                        value = mean
+                    else:
+                        p_mean, p_weight = centroids[i - 1]
+                        p_center = passed - p_weight / 2
+                        center = passed + weight / 2
+                        value = p_mean + (mean - p_mean) * (
+                            target - p_center) / (center - p_center)
+                    break
+                passed += weight
+            result.append(value)
+        return result
+
+
+class StreamingStatistics:
+    """Exponential moving average and time-weighted quantiles sketch of one
+    entity's states.
+
+    Values are fed as (value, duration) segments once they are closed.
+    """
+
+    def __init__(self, ema_time_constant: Optional[float] = None):
+        """Initialize the statistics."""
+        self._tau = ema_time_constant
+        self._ema = None
+        self._stale = 0.0
+        self.digest = TDigest()
+
+    def add(self, value: float, duration: float):
+        """Add closed segment of a value."""
+        if self._tau is not None:
+            if self._ema is None:
+                self._ema = value
+            else:
+                self._ema = value + (self._ema - value) * math.exp(
+                    -duration / self._tau)
+        self.digest.add(value, duration)
+
+    def ema(self, tail: Optional[Tuple[float, float]]) -> Optional[float]:
+        """Return moving average including open tail segment."""
+        if self._tau is None or tail is None:
+            return self._ema
+        value, duration = tail
+        if self._ema is None:
+            return value
+        return value + (self._ema - value) * math.exp(-duration / self._tau)
+
+    def expire(self, duration: float) -> bool:
+        """Account expired segments duration.
+
+        Return True if the digest has to be rebuilt."""
+        self._stale += duration
+        return self._stale > STALE_RATIO * self.digest.total
+
+    def rebuild(self, segments: Iterable[Tuple[float, float]]):
+        """Rebuild the digest from segments actual for the window."""
+        self.digest = TDigest()
+        self._stale = 0.0
+        for value, duration in segments:
+            self.digest.add(value, duration)
+
+
+def combined_quantiles(digests: Iterable[TDigest], tails: Iterable[tuple],
+                       quantiles: Iterable[float]) -> Optional[list]:
+    """Estimate quantiles of several digests plus open tail segments."""
+    centroids = []
+    for digest in digests:
+        centroids.extend(digest.centroids())
+    centroids.sort()
+    for value, duration in tails:
+        if duration > 0:
+            insort(centroids, (value, duration))
+
+    if not centroids:
+        return None
+    return TDigest.quantiles(centroids, quantiles)
@@ -10,14 +10,14 @@ For more details about this platform, please refer to the documentation at
 https://github.com/Limych/ha-car_wash/
 """
 import logging
-from datetime import datetime
+from datetime import datetime, timedelta
 
 import voluptuous as vol
 from homeassistant.components.binary_sensor import BinarySensorDevice
 from homeassistant.components.weather import (
     ATTR_FORECAST_PRECIPITATION, ATTR_FORECAST_TIME, ATTR_FORECAST_TEMP,
     ATTR_FORECAST_TEMP_LOW, ATTR_FORECAST_CONDITION, ATTR_WEATHER_TEMPERATURE,
-    ATTR_FORECAST)
+    ATTR_FORECAST, DOMAIN as WEATHER_DOMAIN)
 from homeassistant.const import (
     CONF_NAME, EVENT_HOMEASSISTANT_START, TEMP_CELSIUS)
 from homeassistant.core import callback
@@ -123,6 +123,58 @@ class CarWashBinarySensor(BinarySensorDevice):
 
         return temperature
 
+    def _get_weather(self):
+        """Return weather entity object if it is loaded."""
+        component = self._hass.data.get(WEATHER_DOMAIN)
+        if component is None:
+            return None
+        return component.get_entity(self._weather_entity)
+
+    @staticmethod
+    def _indexed_forecast(weather, days):
+        """Yield forecast periods of inspected days found by the weather
+        platform range queries.
+
+        Each period is yielded with flag if it is not of the current day."""
+        today = dt_util.start_of_local_day()
+        tomorrow = dt_util.start_of_local_day(
+            today.date() + timedelta(days=1))
+        stop_date = today.date() + timedelta(days=days + 1)
+        stop = dt_util.start_of_local_day(stop_date)
+
+        _LOGGER.debug('Inspect weather forecast from now till %s', stop_date)
+        for start, end, next_day in ((today, tomorrow, False),
+                                     (tomorrow, stop, True)):
+            for fcast in weather.forecast_between(
+                    start.timestamp(), end.timestamp()):
+                _LOGGER.debug('Inspect weather forecast for %s',
+                              fcast.get(ATTR_FORECAST_TIME))
+                yield fcast, next_day
+
+    @staticmethod
+    def _scanned_forecast(forecast, days):
+        """Yield forecast periods of inspected days found by full scan.
+
+        Each period is yielded with flag if it is not of the current day."""
+        cur_date = datetime.now().strftime('%F')
+        stop_date = datetime.fromtimestamp(
+            datetime.now().timestamp() + 86400 * (days + 1)
+        ).strftime('%F')
+
+        _LOGGER.debug('Inspect weather forecast from now till %s', stop_date)
+        for fcast in forecast:
+            fc_date = fcast.get(ATTR_FORECAST_TIME)
+            if isinstance(fc_date, int):
+                fc_date = dt_util.as_local(datetime.utcfromtimestamp(
+                    fc_date / 1000)).isoformat()
+            fc_date = fc_date[:10]
+            if fc_date < cur_date:
+                continue
+            if fc_date == stop_date:
+                break
+            _LOGGER.debug('Inspect weather forecast for %s', fc_date)
+            yield fcast, fc_date != cur_date
+
     async def async_update(self):   # pylint: disable=r0912,r0915
         """Update the sensor state."""
         wdata = self._hass.states.get(self._weather_entity)
@@ -151,24 +203,13 @@ class CarWashBinarySensor(BinarySensorDevice):
             self._state = False
             return
 
-        cur_date = datetime.now().strftime('%F')
-        stop_date = datetime.fromtimestamp(
-            datetime.now().timestamp() + 86400 * (self._days + 1)
-        ).strftime('%F')
-
-        _LOGGER.debug('Inspect weather forecast from now till %s', stop_date)
-        for fcast in forecast:
-            fc_date = fcast.get(ATTR_FORECAST_TIME)
-            if isinstance(fc_date, int):
-                fc_date = dt_util.as_local(datetime.utcfromtimestamp(
-                    fc_date / 1000)).isoformat()
-            fc_date = fc_date[:10]
-            if fc_date < cur_date:
-                continue
-            if fc_date == stop_date:
-                break
-            _LOGGER.debug('Inspect weather forecast for %s', fc_date)
+        weather = self._get_weather()
+        if hasattr(weather, 'forecast_between'):
+            periods = self._indexed_forecast(weather, self._days)
+        else:
+            periods = self._scanned_forecast(forecast, self._days)
 
+        for fcast, next_day in periods:
             prec = fcast.get(ATTR_FORECAST_PRECIPITATION)
             cond = fcast.get(ATTR_FORECAST_CONDITION)
             tmin = fcast.get(ATTR_FORECAST_TEMP_LOW)
@@ -186,7 +227,7 @@ class CarWashBinarySensor(BinarySensorDevice):
                 _LOGGER.debug('Detected bad weather condition')
                 self._state = False
                 return
-            if tmin is not None and fc_date != cur_date:
+            if tmin is not None and next_day:
                 tmin = self._temp2c(tmin, tmpu)
                 if temp < 0 <= tmin:
                     _LOGGER.debug(
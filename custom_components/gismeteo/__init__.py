@@ -10,11 +10,15 @@ For more details about this platform, please refer to the documentation at
 https://github.com/Limych/ha-gismeteo/
 """
 
+import asyncio
 import logging
 import time
 import xml.etree.cElementTree as etree
-from datetime import (datetime)
-from urllib.request import (urlopen)
+from bisect import bisect_left, bisect_right
+from datetime import (datetime, timedelta)
+
+import aiohttp
+import async_timeout
 
 from homeassistant.components.weather import (
     ATTR_FORECAST_CONDITION, ATTR_FORECAST_PRECIPITATION, ATTR_FORECAST_TEMP,
@@ -23,22 +27,23 @@ from homeassistant.components.weather import (
     ATTR_WEATHER_HUMIDITY, ATTR_WEATHER_WIND_SPEED, ATTR_WEATHER_WIND_BEARING)
 from homeassistant.const import (
     STATE_UNKNOWN)
+from homeassistant.core import callback
+from homeassistant.helpers.aiohttp_client import async_get_clientsession
+from homeassistant.helpers.event import async_track_time_interval
 from homeassistant.util import (
     Throttle, dt as dt_util)
 
-from .cache import Cache
+from .cache import Cache, EVICT_INTERVAL, content_hash
+from .cities import get_city_index
+from .condition import get_condition
 from .const import (
     ATTR_FORECAST_HUMIDITY, ATTR_FORECAST_PRESSURE,
-    MIN_TIME_BETWEEN_UPDATES, CONDITION_FOG_CLASSES, ATTR_SUNRISE,
-    ATTR_WEATHER_CLOUDINESS, ATTR_SUNSET,
-    ATTR_WEATHER_PRECIPITATION_INTENSITY, ATTR_WEATHER_PRECIPITATION_TYPE,
-    ATTR_WEATHER_STORM, ATTR_WEATHER_PHENOMENON,
-    ATTR_FORECAST_PRECIPITATION_TYPE, ATTR_WEATHER_CONDITION,
-    ATTR_WEATHER_PRECIPITATION_AMOUNT, ATTR_WEATHER_GEOMAGNETIC_FIELD,
-    ATTR_FORECAST_CLOUDINESS, ATTR_FORECAST_PRECIPITATION_AMOUNT,
-    ATTR_FORECAST_PRECIPITATION_INTENSITY, ATTR_FORECAST_STORM,
-    ATTR_FORECAST_GEOMAGNETIC_FIELD, FORECAST_MODE_HOURLY, FORECAST_MODE_DAILY,
-    BASE_URL, MMHG2HPA, MS2KMH, VERSION, ISSUE_URL, DOMAIN)
+    MIN_TIME_BETWEEN_UPDATES, ATTR_WEATHER_PRECIPITATION_AMOUNT,
+    FORECAST_MODE_HOURLY, FORECAST_MODE_DAILY, BASE_URL, MMHG2HPA, MS2KMH,
+    VERSION, ISSUE_URL, DOMAIN, HTTP_TIMEOUT, HTTP_RETRIES, HTTP_RETRY_DELAY,
+    CITY_CACHE_TIME, MAX_PARALLEL_REQUESTS)
+from .metrics import Metrics
+from .parser import ATTR_HA_CONDITION, parse_forecast
 
 try:
     etree.fromstring('<?xml version="1.0"?><foo><bar/></foo>')
@@ -58,11 +63,102 @@ def setup(hass, config):
     return True
 
 
+@callback
+def async_get_gismeteo(hass, latitude, longitude, mode=FORECAST_MODE_HOURLY,
+                       params=None):
+    """Return data object shared by all entities of the location.
+
+    Weather and sensor entities of the same place and forecast mode are fed
+    from one object, so data are fetched and parsed once per interval.
+    Parameters of the first requester are used to create the object."""
+    if DOMAIN not in hass.data:
+        locations = hass.data[DOMAIN] = GismeteoLocations(
+            async_get_clientsession(hass))
+        # Outdated cache files are dropped in background, not on fetches
+        async_track_time_interval(hass, locations.async_evict_caches,
+                                  timedelta(seconds=EVICT_INTERVAL))
+    return hass.data[DOMAIN].get(latitude, longitude, mode, params)
+
+
+class GismeteoLocations:
+    """Data objects of all configured locations updated together.
+
+    An update of any location updates all of them concurrently, so total
+    update time is bounded by the slowest location instead of the sum.
+    Concurrent requests of the same URL (e.g. hourly and daily data of one
+    city) share a single API request."""
+
+    def __init__(self, session, parallel=MAX_PARALLEL_REQUESTS):
+        """Initialize the locations."""
+        self._session = session
+        self._parallel = parallel
+        self._semaphore = None
+        self._instances = {}
+        self._requests = {}
+
+    def get(self, latitude, longitude, mode, params):
+        """Return data object of the location, create it if needed."""
+        key = (latitude, longitude, mode)
+        if key not in self._instances:
+            self._instances[key] = Gismeteo(
+                self._session, latitude, longitude, mode, params,
+                locations=self)
+        return self._instances[key]
+
+    async def async_update(self):
+        """Get the latest data of all locations."""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self._parallel)
+
+        async def update(instance):
+            async with self._semaphore:
+                await instance.async_update_location()
+
+        instances = list(self._instances.values())
+        results = await asyncio.gather(*[
+            update(instance) for instance in instances
+        ], return_exceptions=True)
+        # Failure of one location must not break update of the others
+        for instance, result in zip(instances, results):
+            if isinstance(result, Exception):
+                _LOGGER.error('Error updating location %s: %s',
+                              instance.location, result)
+
+    async def async_evict_caches(self, _now=None):
+        """Drop outdated files from caches of all locations."""
+        caches = {}
+        for instance in self._instances.values():
+            if instance.cache is not None:
+                caches.setdefault(instance.cache.cache_dir, instance.cache)
+        loop = asyncio.get_event_loop()
+        for cache in caches.values():
+            await loop.run_in_executor(None, cache.evict)
+
+    async def async_request(self, url, request):
+        """Return result of request to URL, join the one in flight if any.
+
+        Return the result and flag if the request in flight was joined."""
+        task = self._requests.get(url)
+        shared = task is not None
+        if task is None:
+            task = asyncio.ensure_future(request())
+            self._requests[url] = task
+            task.add_done_callback(lambda _: self._requests.pop(url, None))
+        # One cancelled requester must not cancel the others
+        return await asyncio.shield(task), shared
+
+
 class Gismeteo:
-    """Get the latest weather data from Gismeteo."""
+    """Get the latest weather data from Gismeteo.
+
+    Data are requested asynchronously by async_update() with given aiohttp
+    session; the nearest city is detected on the first update.
 
-    def __init__(self, latitude=None, longitude=None,
-                 mode=FORECAST_MODE_HOURLY, params=None):
+    In multi-location mode the object belongs to GismeteoLocations and
+    async_update() updates all locations at once."""
+
+    def __init__(self, session, latitude=None, longitude=None,
+                 mode=FORECAST_MODE_HOURLY, params=None, locations=None):
         """Initialize the data object."""
         params = params or {}
         params['domain'] = DOMAIN
@@ -73,44 +169,113 @@ class Gismeteo:
         self._mode = mode
         self._cache = Cache(params) if params.get(
             'cache_dir') is not None else None
+        self._cities = get_city_index(params.get('cache_dir'))
 
-        self._city_id = self._get_city_id(latitude, longitude)
-        _LOGGER.debug('Nearest city ID: %s', self._city_id)
+        self._latitude = latitude
+        self._longitude = longitude
+        self._session = session
+        self._locations = locations
+        self.metrics = Metrics()
+        self._update_lock = None
+        self._city_id = None
 
         self._current = {}
         self._forecast = []
+        self._projection = None
+        self._content_hash = None
         self._timezone = dt_util.get_time_zone(
             params.get('timezone')) if params.get(
             'timezone') is not None else dt_util.DEFAULT_TIME_ZONE
 
-    def _http_request(self, url, cache_fname=None):
-        """Request to API and cache results."""
-        if self._cache and cache_fname is not None:
-            cache_fname += '.xml'
-            if self._cache.is_cached(cache_fname):
-                return self._cache.read_cache(cache_fname)
+    @property
+    def cache(self):
+        """Return cache of fetched data or None if it is not used."""
+        return self._cache
+
+    @property
+    def location(self):
+        """Return description of the location for logs."""
+        return '{}, {} ({})'.format(
+            self._latitude, self._longitude, self._mode)
+
+    async def _async_http_request(self, url, cache_fname=None, ttl=None):
+        """Request to API, share concurrent requests with other locations."""
+        if self._locations is None:
+            return await self._async_fetch(url, cache_fname, ttl)
+        start = self.metrics.timer()
+        response, shared = await self._locations.async_request(
+            url, lambda: self._async_fetch(url, cache_fname, ttl))
+        if shared:
+            self.metrics.add_shared(start, response)
+        return response
 
-        try:
-            req = urlopen(url)
-        except IOError:
-            return ''
+    async def _async_fetch(self, url, cache_fname=None, ttl=None):
+        """Request to API asynchronously and cache results.
 
-        response = req.read()
-        req.close()
+        Outdated cached data are revalidated with conditional request."""
+        loop = asyncio.get_event_loop()
+        if self._cache and cache_fname is not None:
+            cache_fname += '.xml'
+            cached = await loop.run_in_executor(
+                None, self._cache.is_cached, cache_fname)
+            self.metrics.add_cache_lookup(cached)
+            if cached:
+                return await loop.run_in_executor(
+                    None, self._cache.read_cache, cache_fname)
+            headers = await loop.run_in_executor(
+                None, self._cache.get_validators, cache_fname)
+        else:
+            headers = {}
+
+        response = ''
+        resp_headers = None
+        for attempt in range(HTTP_RETRIES):
+            if attempt:
+                await asyncio.sleep(HTTP_RETRY_DELAY * attempt)
+            # Time each attempt, so back-off is not counted as latency
+            start = self.metrics.timer()
+            try:
+                with async_timeout.timeout(HTTP_TIMEOUT):
+                    async with self._session.get(
+                            url, headers=headers) as resp:
+                        not_modified = resp.status == 304 and bool(headers)
+                        if not not_modified:
+                            resp.raise_for_status()
+                            response = await resp.read()
+                            resp_headers = resp.headers
+            except asyncio.TimeoutError:
+                _LOGGER.warning('Request to %s timed out', url)
+            except aiohttp.ClientError as error:
+                _LOGGER.warning('Error requesting %s: %s', url, error)
+            else:
+                if not_modified:
+                    _LOGGER.debug('Data are not modified: %s', url)
+                    self.metrics.add_revalidation(start)
+                    return await loop.run_in_executor(
+                        None, self._cache.revalidate_cache, cache_fname)
+                self.metrics.add_request(start, response)
+                break
+            self.metrics.add_request(start, response)
 
         if self._cache and cache_fname is not None and response:
-            self._cache.save_cache(cache_fname, response)
+            await loop.run_in_executor(
+                None, self._cache.save_cache, cache_fname, response,
+                resp_headers, ttl)
 
         return response
 
-    def _get_city_id(self, lat, lng):
-        """Return the nearest city ID."""
+    @staticmethod
+    def _city_request(lat, lng):
+        """Return URL and cache file name of the nearest city request."""
         url = (
                 BASE_URL + '/cities/?lat={}&lng={}&count=1&lang=en'
         ).format(lat, lng)
         cache_fname = 'city_{}_{}'.format(lat, lng)
+        return url, cache_fname
 
-        response = self._http_request(url, cache_fname)
+    @staticmethod
+    def _parse_city_id(response):
+        """Return the nearest city ID from API response."""
         if not response:
             _LOGGER.error("Can't detect nearest city!")
             return None
@@ -119,57 +284,30 @@ class Gismeteo:
         item = xml.find('item')
         return int(item.get('id'))
 
-    @staticmethod
-    def _is_day(testing_time, sunrise_time, sunset_time):
-        """Checking is sun are shining"""
-        return sunrise_time < testing_time < sunset_time
+    async def _async_get_city_id(self, lat, lng):
+        """Return the nearest city ID.
+
+        Places near already resolved ones are resolved without API."""
+        loop = asyncio.get_event_loop()
+        city_id = await loop.run_in_executor(
+            None, self._cities.nearest, lat, lng)
+        if city_id is not None:
+            return city_id
+
+        response = await self._async_http_request(
+            *self._city_request(lat, lng), ttl=CITY_CACHE_TIME)
+        city_id = self._parse_city_id(response)
+        if city_id is not None:
+            await loop.run_in_executor(
+                None, self._cities.add, lat, lng, city_id)
+        return city_id
 
     def condition(self, src=None):
         """Return the current condition."""
         src = src or self._current
-
-        cl = src.get(ATTR_WEATHER_CLOUDINESS)
-        if cl is None:
-            return None
-        if cl == 0:
-            if self._mode == FORECAST_MODE_DAILY or self._is_day(
-                    src.get(ATTR_FORECAST_TIME, time.time()),
-                    src.get(ATTR_SUNRISE),
-                    src.get(ATTR_SUNSET)
-            ):
-                cond = "sunny"  # Sunshine
-            else:
-                cond = "clear-night"  # Clear night
-        elif cl == 1:
-            cond = "partlycloudy"  # A few clouds
-        elif cl == 2:
-            cond = "partlycloudy"  # A some clouds
-        else:
-            cond = "cloudy"  # Many clouds
-
-        pr_type = src.get(ATTR_WEATHER_PRECIPITATION_TYPE)
-        pr_int = src.get(ATTR_WEATHER_PRECIPITATION_INTENSITY)
-        if src.get(ATTR_WEATHER_STORM):
-            cond = "lightning"  # Lightning/ thunderstorms
-            if pr_type != 0:
-                cond = "lightning-rainy"  # Lightning/ thunderstorms and rain
-        elif pr_type == 1:
-            cond = "rainy"  # Rain
-            if pr_int == 3:
-                cond = "pouring"  # Pouring rain
-        elif pr_type == 2:
-            cond = "snowy"  # Snow
-        elif pr_type == 3:
-            cond = "snowy-rainy"  # Snow and Rain
-        elif self.wind_speed_ms(src) > 10.8:
-            if cond == "cloudy":
-                cond = "windy-variant"  # Wind and clouds
-            else:
-                cond = "windy"  # Wind
-        elif cl == 0 and src.get(ATTR_WEATHER_PHENOMENON) is not None \
-                and src.get(ATTR_WEATHER_PHENOMENON) in CONDITION_FOG_CLASSES:
-            cond = "fog"  # Fog
-
+        cond = src.get(ATTR_HA_CONDITION)
+        if cond is None:
+            cond = get_condition(src, self._mode == FORECAST_MODE_DAILY)
         return cond
 
     def temperature(self, src=None):
@@ -222,10 +360,53 @@ class Gismeteo:
         return precipitation if precipitation is not None else STATE_UNKNOWN
 
     def forecast(self, src=None):
-        """Return the forecast array."""
-        src = src or self._forecast
+        """Return the forecast array.
+
+        Forecast of fetched data is projected once per fetch; following
+        calls only drop periods passed since then."""
+        if src:
+            times, forecast = self._project_forecast(src)
+        else:
+            times, forecast = self._get_projection()
+
+        start = self._current_period(times)
+        return forecast[start:] if start else forecast
+
+    def forecast_between(self, start_time, end_time):
+        """Return forecast periods started in [start_time, end_time)."""
+        times, forecast = self._get_projection()
+        return forecast[
+            bisect_left(times, start_time):bisect_left(times, end_time)]
+
+    def forecast_after(self, after_time):
+        """Return the first forecast period started after given time.
+
+        Return None if there is no such period."""
+        times, forecast = self._get_projection()
+        idx = bisect_right(times, after_time)
+        return forecast[idx] if idx < len(forecast) else None
+
+    @staticmethod
+    def _current_period(times):
+        """Return index of the current period in sorted forecast times."""
+        # Keep the last passed period as the current one
+        return max(bisect_left(times, int(time.time())) - 1, 0)
+
+    def _get_projection(self):
+        """Return fetched forecast projected to weather entity format."""
+        if self._projection is None:
+            start = self.metrics.timer()
+            self._projection = self._project_forecast(self._forecast)
+            self.metrics.projection_time = self.metrics.elapsed(start)
+        return self._projection
+
+    def _project_forecast(self, src):
+        """Convert forecast data to weather entity format.
+
+        Return sorted list of forecast times and list of converted periods
+        in the same order."""
+        times = []
         forecast = []
-        now = int(time.time())
         dt_util.set_default_time_zone(self._timezone)
         for e in src:
             fc_time = e.get(ATTR_FORECAST_TIME)
@@ -257,164 +438,68 @@ class Gismeteo:
                 data[ATTR_FORECAST_TEMP_LOW] = e.get(
                     ATTR_FORECAST_TEMP_LOW)
 
-            if fc_time < now:
-                forecast = [data]
-            else:
-                forecast.append(data)
+            times.append(fc_time)
+            forecast.append(data)
 
-        return forecast
+        return times, forecast
 
-    @staticmethod
-    def _get_utime(source, tzone):
-        local_date = source
-        if len(source) <= 10:
-            local_date += 'T00:00:00'
-        tz_h, tz_m = divmod(abs(tzone), 60)
-        local_date += \
-            "+{:02}:{:02}".format(tz_h, tz_m) if tzone >= 0 else \
-            "-{:02}:{:02}".format(tz_h, tz_m)
-        return dt_util.as_timestamp(local_date)
+    def _forecast_request(self):
+        """Return URL and cache file name of the forecast request."""
+        url = (BASE_URL + '/forecast/?city={}&lang=en').format(self._city_id)
+        cache_fname = 'forecast_{}'.format(self._city_id)
+        return url, cache_fname
+
+    async def async_update(self):
+        """Get the latest data from Gismeteo without blocking."""
+        if self._locations is not None:
+            await self._locations.async_update()
+        else:
+            await self.async_update_location()
+
+    async def async_update_location(self):
+        """Get the latest data of this location.
+
+        Concurrent callers wait for the data requested by the first one."""
+        if self._update_lock is None:
+            self._update_lock = asyncio.Lock()
+        async with self._update_lock:
+            await self._async_update()
 
     @Throttle(MIN_TIME_BETWEEN_UPDATES)
-    def update(self):
-        """Get the latest data from Gismeteo."""
+    async def _async_update(self):
+        """Get the latest data from Gismeteo once per interval."""
         if self._city_id is None:
-            return
-
-        url = (BASE_URL + '/forecast/?city={}&lang=en').format(self._city_id)
-        cache_fname = 'forecast_{}'.format(self._city_id)
+            self._city_id = await self._async_get_city_id(
+                self._latitude, self._longitude)
+            _LOGGER.debug('Nearest city ID: %s', self._city_id)
+            if self._city_id is None:
+                return
 
-        response = self._http_request(url, cache_fname)
+        response = await self._async_http_request(*self._forecast_request())
         if not response:
             _LOGGER.warning("Can't update weather data!")
             return
 
-        xml = etree.fromstring(response)
-        tzone = int(xml.find('location').get('tzone'))
-        current = xml.find('location/fact')
-        current_v = current.find('values')
-
-        pr_amount = current_v.get('prflt')
-        if pr_amount is not None:
-            pr_amount = float(pr_amount)
-
-        self._current = {
-            ATTR_SUNRISE: int(current.get('sunrise')),
-            ATTR_SUNSET: int(current.get('sunset')),
-
-            ATTR_WEATHER_CONDITION:
-                current_v.get('descr'),
-            ATTR_WEATHER_TEMPERATURE:
-                float(current_v.get('tflt')),
-            ATTR_WEATHER_PRESSURE:
-                int(current_v.get('p')),
-            ATTR_WEATHER_HUMIDITY:
-                int(current_v.get('hum')),
-            ATTR_WEATHER_WIND_SPEED:
-                int(current_v.get('ws')),
-            ATTR_WEATHER_WIND_BEARING:
-                int(current_v.get('wd')),
-            ATTR_WEATHER_CLOUDINESS:
-                int(current_v.get('cl')),
-            ATTR_WEATHER_PRECIPITATION_TYPE:
-                int(current_v.get('pt')),
-            ATTR_WEATHER_PRECIPITATION_AMOUNT:
-                pr_amount,
-            ATTR_WEATHER_PRECIPITATION_INTENSITY:
-                int(current_v.get('pr')),
-            ATTR_WEATHER_STORM:
-                (current_v.get('ts') == 1),
-            ATTR_WEATHER_GEOMAGNETIC_FIELD:
-                int(current_v.get('grade')),
-            ATTR_WEATHER_PHENOMENON:
-                int(current_v.get('ph')),
-        }
+        # Hashing and parsing are too slow for event loop on small boards
+        parsed = await asyncio.get_event_loop().run_in_executor(
+            None, self._parse_forecast, response)
+        if parsed is None:
+            _LOGGER.debug('Weather data are not changed')
+            return
+        self._content_hash, self._current, self._forecast = parsed
+        self._projection = None
 
-        self._forecast = []
-        if self._mode == FORECAST_MODE_HOURLY:
-            for day in xml.findall('location/day'):
-                sunrise = int(day.get('sunrise'))
-                sunset = int(day.get('sunset'))
-
-                for fc in day.findall('forecast'):
-                    fc_v = fc.find('values')
-
-                    pr_amount = fc_v.get('prflt')
-                    if pr_amount is not None:
-                        pr_amount = float(pr_amount)
-
-                    data = {
-                        ATTR_SUNRISE: sunrise,
-                        ATTR_SUNSET: sunset,
-
-                        ATTR_FORECAST_TIME:
-                            self._get_utime(fc.get('valid'), tzone),
-                        ATTR_FORECAST_CONDITION:
-                            fc_v.get('descr'),
-                        ATTR_FORECAST_TEMP:
-                            int(fc_v.get('t')),
-                        ATTR_FORECAST_PRESSURE:
-                            int(fc_v.get('p')),
-                        ATTR_FORECAST_HUMIDITY:
-                            int(fc_v.get('hum')),
-                        ATTR_FORECAST_WIND_SPEED:
-                            int(fc_v.get('ws')),
-                        ATTR_FORECAST_WIND_BEARING:
-                            int(fc_v.get('wd')),
-                        ATTR_FORECAST_CLOUDINESS:
-                            int(fc_v.get('cl')),
-                        ATTR_FORECAST_PRECIPITATION_TYPE:
-                            int(fc_v.get('pt')),
-                        ATTR_FORECAST_PRECIPITATION_AMOUNT:
-                            pr_amount,
-                        ATTR_FORECAST_PRECIPITATION_INTENSITY:
-                            int(fc_v.get('pr')),
-                        ATTR_FORECAST_STORM:
-                            (fc_v.get('ts') == 1),
-                        ATTR_FORECAST_GEOMAGNETIC_FIELD:
-                            int(fc_v.get('grade')),
-                    }
-
-                    self._forecast.append(data)
-
-        else:  # self._mode == FORECAST_MODE_DAILY
-            for day in xml.findall('location/day[@descr]'):
-                pr_amount = day.get('prflt')
-                if pr_amount is not None:
-                    pr_amount = float(pr_amount)
-
-                data = {
-                    ATTR_SUNRISE: int(day.get('sunrise')),
-                    ATTR_SUNSET: int(day.get('sunset')),
-
-                    ATTR_FORECAST_TIME:
-                        self._get_utime(day.get('date'), tzone),
-                    ATTR_FORECAST_CONDITION:
-                        day.get('descr'),
-                    ATTR_FORECAST_TEMP:
-                        int(day.get('tmax')),
-                    ATTR_FORECAST_TEMP_LOW:
-                        int(day.get('tmin')),
-                    ATTR_FORECAST_PRESSURE:
-                        int(day.get('p')),
-                    ATTR_FORECAST_HUMIDITY:
-                        int(day.get('hum')),
-                    ATTR_FORECAST_WIND_SPEED:
-                        int(day.get('ws')),
-                    ATTR_FORECAST_WIND_BEARING:
-                        int(day.get('wd')),
-                    ATTR_FORECAST_CLOUDINESS:
-                        int(day.get('cl')),
-                    ATTR_FORECAST_PRECIPITATION_TYPE:
-                        int(day.get('pt')),
-                    ATTR_FORECAST_PRECIPITATION_AMOUNT:
-                        pr_amount,
-                    ATTR_FORECAST_PRECIPITATION_INTENSITY:
-                        int(day.get('pr')),
-                    ATTR_FORECAST_STORM:
-                        (day.get('ts') == 1),
-                    ATTR_FORECAST_GEOMAGNETIC_FIELD:
-                        int(day.get('grademax')),
-                }
-
-                self._forecast.append(data)
+    def _parse_forecast(self, response):
+        """Parse forecast data from API response.
+
+        Return (content hash, current weather, forecast) or None if data
+        are not changed since the last parse."""
+        data_hash = content_hash(response)
+        if data_hash == self._content_hash:
+            return None
+
+        start = self.metrics.timer()
+        current, forecast = parse_forecast(response, self._mode)
+        self.metrics.parse_time = self.metrics.elapsed(start)
+        self.metrics.forecast_records = len(forecast)
+        return data_hash, current or {}, forecast
@@ -1,14 +1,54 @@
 #  Copyright (c) 2018, Vladimir Maksimenko <vl.maksime@gmail.com>
 #  Copyright (c) 2019, Andrey "Limych" Khrolenok <andrey@khrolenok.ru>
 #
-# Version 3.0
+# Version 3.1
 
+import hashlib
+import json
 import logging
 import os
+import tempfile
+import threading
 import time
+from collections import OrderedDict
 
 _LOGGER = logging.getLogger(__name__)
 
+META_SUFFIX = '.meta'
+
+DEFAULT_MEMORY_SIZE = 16        # entries
+DEFAULT_MAX_BYTES = 5 * 2**20   # bytes
+DEFAULT_MAX_AGE = 86400         # seconds
+EVICT_INTERVAL = 3600           # seconds
+
+# Memory tiers are shared by all caches of the same directory and domain,
+# so data stored by one of them are served to others without disk access
+_MEMORIES = {}
+_MEMORIES_LOCK = threading.Lock()
+
+
+def content_hash(content):
+    if isinstance(content, str):
+        content = content.encode('utf-8')
+    return hashlib.sha1(content).hexdigest()
+
+
+class _Entry:
+    __slots__ = ('mtime', 'content', 'meta')
+
+    def __init__(self, mtime, content, meta):
+        self.mtime = mtime
+        self.content = content
+        self.meta = meta
+
+
+def _get_memory(cache_dir, domain):
+    with _MEMORIES_LOCK:
+        key = (cache_dir, domain)
+        if key not in _MEMORIES:
+            _MEMORIES[key] = (OrderedDict(), threading.Lock())
+        return _MEMORIES[key]
+
 
 class Cache:
     def __init__(self, params=None):
@@ -18,13 +58,23 @@ class Cache:
         self._cache_dir = params.get('cache_dir', '')
         self._cache_time = params.get('cache_time', 0)
         self._domain = params.get('domain')
+        self._memory_size = params.get('memory_size', DEFAULT_MEMORY_SIZE)
+        self._max_bytes = params.get('max_bytes', DEFAULT_MAX_BYTES)
+        self._max_age = params.get('max_age', DEFAULT_MAX_AGE)
 
         if self._cache_dir:
             self._cache_dir = os.path.abspath(self._cache_dir)
 
+        # Recently used entries are served from memory without disk access
+        self._memory, self._lock = _get_memory(self._cache_dir, self._domain)
+
         if params.get('clean_dir', False):
             self._clean_dir()
 
+    @property
+    def cache_dir(self):
+        return self._cache_dir
+
     def _clean_dir(self):
         now_time = time.time()
 
@@ -41,44 +91,189 @@ class Cache:
                 except FileNotFoundError:
                     pass
 
+    def evict(self):
+        if not self._cache_dir or not os.path.exists(self._cache_dir):
+            return
+
+        now_time = time.time()
+        prefix = self._domain + '.' if self._domain else ''
+
+        files = []
+        ttls = {}
+        for file_name in os.listdir(self._cache_dir):
+            if not file_name.startswith(prefix):
+                continue
+            file_path = os.path.join(self._cache_dir, file_name)
+            try:
+                stat = os.stat(file_path)
+            except OSError:
+                continue
+            if file_name.endswith(META_SUFFIX):
+                try:
+                    with open(file_path) as file:
+                        ttl = json.load(file).get('ttl')
+                except (OSError, ValueError, AttributeError):
+                    ttl = None
+                if ttl:
+                    ttls[file_name[:-len(META_SUFFIX)]] = ttl
+            files.append((stat.st_mtime, stat.st_size, file_name))
+
+        # Drop outdated files first, then the oldest ones above size limit
+        files.sort()
+        total = sum(size for _, size, _ in files)
+        removed = []
+        for file_time, size, file_name in files:
+            base_name = file_name[:-len(META_SUFFIX)] \
+                if file_name.endswith(META_SUFFIX) else file_name
+            max_age = max(self._max_age, ttls.get(base_name, 0))
+            if file_time + max_age > now_time \
+                    and total <= self._max_bytes:
+                continue
+            try:
+                os.remove(os.path.join(self._cache_dir, file_name))
+            except FileNotFoundError:
+                pass
+            total -= size
+            removed.append(file_name[len(prefix):])
+
+        if removed:
+            _LOGGER.debug('Evicted cache files: %s', removed)
+            with self._lock:
+                for file_name in removed:
+                    self._memory.pop(file_name, None)
+
     def _get_file_path(self, file_name):
         if self._domain:
             file_name = '.'.join((self._domain, file_name))
         return os.path.join(self._cache_dir, file_name)
 
-    def is_cached(self, file_name):
-        result = False
+    def _memory_get(self, file_name):
+        with self._lock:
+            entry = self._memory.get(file_name)
+            if entry is not None:
+                self._memory.move_to_end(file_name)
+            return entry
+
+    def _memory_put(self, file_name, entry):
+        with self._lock:
+            self._memory[file_name] = entry
+            self._memory.move_to_end(file_name)
+            while len(self._memory) > self._memory_size:
+                self._memory.popitem(last=False)
+
+    def _load(self, file_name):
+        entry = self._memory_get(file_name)
+        if entry is not None:
+            return entry
 
         file_path = self._get_file_path(file_name)
-        if os.path.exists(file_path) \
-                and os.path.isfile(file_path):
+        try:
             file_time = os.path.getmtime(file_path)
-            now_time = time.time()
+            _LOGGER.debug('Read cache file %s', file_path)
+            with open(file_path) as file:
+                content = file.read()
+        except (FileNotFoundError, IsADirectoryError):
+            return None
 
-            result = (file_time + self._cache_time) >= now_time
+        entry = _Entry(file_time, content, self._read_meta(file_path))
+        self._memory_put(file_name, entry)
+        return entry
 
-        return result
+    @staticmethod
+    def _read_meta(file_path):
+        try:
+            with open(file_path + META_SUFFIX) as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return {}
+
+    def _is_fresh(self, entry):
+        ttl = entry.meta.get('ttl') or self._cache_time
+        return (entry.mtime + ttl) >= time.time()
+
+    def _write_file(self, file_path, content):
+        # Write to temporary file first, so readers never see partial data
+        fd, tmp_path = tempfile.mkstemp(
+            dir=self._cache_dir, prefix=os.path.basename(file_path) + '.',
+            suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as file:
+                file.write(content)
+            os.replace(tmp_path, file_path)
+        except OSError:
+            os.remove(tmp_path)
+            raise
+
+    def is_cached(self, file_name):
+        entry = self._load(file_name)
+        return entry is not None and self._is_fresh(entry)
 
     def read_cache(self, file_name):
+        entry = self._load(file_name)
+        if entry is not None and self._is_fresh(entry):
+            return entry.content
+        return None
+
+    def get_validators(self, file_name):
+        entry = self._load(file_name)
+        meta = entry.meta if entry is not None else {}
+        headers = {}
+        if meta.get('etag'):
+            headers['If-None-Match'] = meta['etag']
+        if meta.get('last_modified'):
+            headers['If-Modified-Since'] = meta['last_modified']
+        return headers
+
+    def touch_cache(self, file_name):
         file_path = self._get_file_path(file_name)
-        _LOGGER.debug('Read cache file %s', file_path)
-        if self.is_cached(file_name):
-            file = open(file_path)
-            content = file.read()
-            file.close()
-        else:
-            content = None
+        _LOGGER.debug('Touch cache file %s', file_path)
+        for path in (file_path, file_path + META_SUFFIX):
+            try:
+                os.utime(path)
+            except FileNotFoundError:
+                pass
 
-        return content
+        entry = self._memory_get(file_name)
+        if entry is not None:
+            entry.mtime = time.time()
 
-    def save_cache(self, file_name, content):
-        if self._cache_dir:
-            if not os.path.exists(self._cache_dir):
-                os.makedirs(self._cache_dir)
+    def revalidate_cache(self, file_name):
+        self.touch_cache(file_name)
+        return self.read_cache(file_name)
+
+    def save_cache(self, file_name, content, headers=None, ttl=None):
+        if not self._cache_dir:
+            return True
 
-            file_path = self._get_file_path(file_name)
+        if not os.path.exists(self._cache_dir):
+            os.makedirs(self._cache_dir)
+
+        if isinstance(content, bytes):
+            content = content.decode('utf-8')
+        file_path = self._get_file_path(file_name)
+        headers = headers or {}
+        meta = {
+            'etag': headers.get('ETag'),
+            'last_modified': headers.get('Last-Modified'),
+            'hash': content_hash(content),
+        }
+        if ttl is not None:
+            meta['ttl'] = ttl
+
+        # Only hash of old content is needed, don't read the content itself
+        entry = self._memory_get(file_name)
+        old_meta = entry.meta if entry is not None \
+            else self._read_meta(file_path)
+        changed = old_meta.get('hash') != meta['hash'] \
+            or not os.path.exists(file_path)
+        if changed:
             _LOGGER.debug('Store cache file %s', file_path)
+            self._write_file(file_path, content)
+        if meta != old_meta:
+            self._write_file(file_path + META_SUFFIX, json.dumps(meta))
+        if not changed:
+            self.touch_cache(file_name)
+
+        self._memory_put(file_name, _Entry(time.time(), content, meta))
 
-            file = open(file_path, "w")
-            file.write(content.decode('utf-8'))
-            file.close()
+        return changed
@@ -0,0 +1,138 @@
+#
+#  Copyright (c) 2019, Andrey "Limych" Khrolenok <andrey@khrolenok.ru>
+#  Creative Commons BY-NC-SA 4.0 International Public License
+#  (see LICENSE.md or https://creativecommons.org/licenses/by-nc-sa/4.0/)
+#
+"""
+Persistent index of resolved Gismeteo cities.
+
+For more details about this platform, please refer to the documentation at
+https://github.com/Limych/ha-gismeteo/
+"""
+import json
+import logging
+import math
+import os
+import tempfile
+import threading
+from collections import defaultdict
+
+_LOGGER = logging.getLogger(__name__)
+
+EARTH_RADIUS = 6371.0   # km
+CELL_SIZE = 0.1     # degrees
+
+INDEX_FILE = 'gismeteo_cities.json'
+
+_INDEXES = {}
+_INDEXES_LOCK = threading.Lock()
+
+
+def get_city_index(cache_dir=None):
+    """Return cities index shared by all data objects using the directory."""
+    file_path = os.path.join(cache_dir, INDEX_FILE) if cache_dir else None
+    with _INDEXES_LOCK:
+        if file_path not in _INDEXES:
+            _INDEXES[file_path] = CityIndex(file_path)
+        return _INDEXES[file_path]
+
+
+def distance(lat1, lng1, lat2, lng2):
+    """Return great-circle distance between points in km."""
+    lat1, lng1, lat2, lng2 = map(math.radians, (lat1, lng1, lat2, lng2))
+    hav = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(
+        lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS * math.asin(math.sqrt(hav))
+
+
+class CityIndex:
+    """Places with already resolved nearest city IDs.
+
+    Places are bucketed into grid cells of CELL_SIZE degrees, so a lookup
+    checks only points of few cells around the place. Any place closer
+    than radius to a resolved one gets the same city without API request.
+    """
+
+    def __init__(self, file_path=None, radius=2.0):
+        """Initialize the index."""
+        self._file_path = file_path
+        self._radius = radius
+        self._points = []
+        self._cells = defaultdict(list)
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _cell(lat, lng):
+        """Return grid cell of the point."""
+        return math.floor(lat / CELL_SIZE), math.floor(lng / CELL_SIZE)
+
+    def _load(self):
+        """Load resolved places from disk once."""
+        self._loaded = True
+        if not self._file_path or not os.path.isfile(self._file_path):
+            return
+
+        try:
+            with open(self._file_path) as file:
+                points = json.load(file)
+        except (OSError, ValueError) as error:
+            _LOGGER.warning("Can't load cities index: %s", error)
+            return
+
+        for lat, lng, city_id in points:
+            self._insert(lat, lng, city_id)
+
+    def _insert(self, lat, lng, city_id):
+        """Add resolved place to the index in memory."""
+        point = (lat, lng, city_id)
+        self._points.append(point)
+        self._cells[self._cell(lat, lng)].append(point)
+
+    def _save(self):
+        """Store resolved places to disk."""
+        if not self._file_path:
+            return
+
+        dir_path = os.path.dirname(self._file_path)
+        try:
+            if not os.path.exists(dir_path):
+                os.makedirs(dir_path)
+            fd, tmp_path = tempfile.mkstemp(dir=dir_path, suffix='.tmp')
+            with os.fdopen(fd, 'w') as file:
+                json.dump(self._points, file)
+            os.replace(tmp_path, self._file_path)
+        except OSError as error:
+            _LOGGER.warning("Can't save cities index: %s", error)
+
+    def nearest(self, lat, lng):
+        """Return city ID resolved for a place near given one or None."""
+        with self._lock:
+            if not self._loaded:
+                self._load()
+
+            cell_lat, cell_lng = self._cell(lat, lng)
+            span_lat = math.ceil(
+                math.degrees(self._radius / EARTH_RADIUS) / CELL_SIZE)
+            cos_lat = max(math.cos(math.radians(lat)), 0.01)
+            span_lng = math.ceil(math.degrees(
+                self._radius / EARTH_RADIUS / cos_lat) / CELL_SIZE)
+
+            result = None
+            best = self._radius
+            for d_lat in range(-span_lat, span_lat + 1):
+                for d_lng in range(-span_lng, span_lng + 1):
+                    for p_lat, p_lng, city_id in self._cells.get(
+                            (cell_lat + d_lat, cell_lng + d_lng), ()):
+                        dist = distance(lat, lng, p_lat, p_lng)
+                        if dist <= best:
+                            result, best = city_id, dist
+            return result
+
+    def add(self, lat, lng, city_id):
+        """Remember city ID resolved for the place."""
+        with self._lock:
+            if not self._loaded:
+                self._load()
+            self._insert(lat, lng, city_id)
+            self._save()
@@ -0,0 +1,111 @@
+#
+#  Copyright (c) 2019, Andrey "Limych" Khrolenok <andrey@khrolenok.ru>
+#  Creative Commons BY-NC-SA 4.0 International Public License
+#  (see LICENSE.md or https://creativecommons.org/licenses/by-nc-sa/4.0/)
+#
+"""
+Weather condition classification of Gismeteo data.
+
+For more details about this platform, please refer to the documentation at
+https://github.com/Limych/ha-gismeteo/
+"""
+import time
+from itertools import product
+
+from homeassistant.components.weather import (
+    ATTR_FORECAST_TIME, ATTR_WEATHER_WIND_SPEED)
+
+from .const import (
+    ATTR_SUNRISE, ATTR_SUNSET, ATTR_WEATHER_CLOUDINESS,
+    ATTR_WEATHER_PRECIPITATION_TYPE, ATTR_WEATHER_PRECIPITATION_INTENSITY,
+    ATTR_WEATHER_STORM, ATTR_WEATHER_PHENOMENON, CONDITION_FOG_CLASSES)
+
+WINDY_SPEED = 10.8  # m/s
+
+# Packed classes of source values
+CLOUDINESS_CLASSES = (0, 1, 2, 3)   # 3 is for any other cloudiness
+PRECIPITATION_CLASSES = (0, 1, 2, 3, 4)     # 4 is for any other type
+
+_FOG_CLASSES = frozenset(CONDITION_FOG_CLASSES)
+
+
+def is_day(testing_time, sunrise_time, sunset_time):
+    """Checking is sun are shining"""
+    return sunrise_time < testing_time < sunset_time
+
+
+def _classify(cloudiness, pr_type, heavy, storm, windy, fog, day):
+    """Return condition of packed source values."""
+    if cloudiness == 0:
+        cond = "sunny" if day else "clear-night"  # Sunshine / Clear night
+    elif cloudiness in (1, 2):
+        cond = "partlycloudy"  # A few / some clouds
+    else:
+        cond = "cloudy"  # Many clouds
+
+    if storm:
+        cond = "lightning"  # Lightning/ thunderstorms
+        if pr_type != 0:
+            cond = "lightning-rainy"  # Lightning/ thunderstorms and rain
+    elif pr_type == 1:
+        cond = "rainy"  # Rain
+        if heavy:
+            cond = "pouring"  # Pouring rain
+    elif pr_type == 2:
+        cond = "snowy"  # Snow
+    elif pr_type == 3:
+        cond = "snowy-rainy"  # Snow and Rain
+    elif windy:
+        if cond == "cloudy":
+            cond = "windy-variant"  # Wind and clouds
+        else:
+            cond = "windy"  # Wind
+    elif cloudiness == 0 and fog:
+        cond = "fog"  # Fog
+
+    return cond
+
+
+CONDITIONS = {
+    key: _classify(*key)
+    for key in product(CLOUDINESS_CLASSES, PRECIPITATION_CLASSES,
+                       *[(False, True)] * 5)
+}
+
+
+def condition_key(src, daily):
+    """Pack source values which define weather condition.
+
+    Return None if there is no data to classify."""
+    cloudiness = src.get(ATTR_WEATHER_CLOUDINESS)
+    if cloudiness is None:
+        return None
+    if cloudiness not in CLOUDINESS_CLASSES:
+        cloudiness = 3
+
+    pr_type = src.get(ATTR_WEATHER_PRECIPITATION_TYPE)
+    if pr_type not in PRECIPITATION_CLASSES:
+        pr_type = 4
+
+    speed = src.get(ATTR_WEATHER_WIND_SPEED)
+    day = cloudiness == 0 and (daily or is_day(
+        src.get(ATTR_FORECAST_TIME, time.time()),
+        src.get(ATTR_SUNRISE),
+        src.get(ATTR_SUNSET)
+    ))
+
+    return (
+        cloudiness,
+        pr_type,
+        src.get(ATTR_WEATHER_PRECIPITATION_INTENSITY) == 3,
+        bool(src.get(ATTR_WEATHER_STORM)),
+        speed is not None and float(speed) > WINDY_SPEED,
+        src.get(ATTR_WEATHER_PHENOMENON) in _FOG_CLASSES,
+        day,
+    )
+
+
+def get_condition(src, daily):
+    """Return weather condition of source values."""
+    key = condition_key(src, daily)
+    return CONDITIONS[key] if key is not None else None
@@ -34,6 +34,13 @@ DEFAULT_NAME = 'Gismeteo'
 
 MIN_TIME_BETWEEN_UPDATES = timedelta(minutes=5)
 
+HTTP_TIMEOUT = 10   # seconds
+HTTP_RETRIES = 3
+HTTP_RETRY_DELAY = 2    # seconds
+MAX_PARALLEL_REQUESTS = 4
+
+CITY_CACHE_TIME = 30 * 86400    # seconds
+
 CONDITION_FOG_CLASSES = [11, 12, 28, 40, 41, 42, 43, 44, 45, 46, 47, 48,
                          49, 120, 130, 131, 132, 133, 134, 135, 528]
 
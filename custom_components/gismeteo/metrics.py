@@ -0,0 +1,114 @@
+#
+#  Copyright (c) 2019, Andrey "Limych" Khrolenok <andrey@khrolenok.ru>
+#  Creative Commons BY-NC-SA 4.0 International Public License
+#  (see LICENSE.md or https://creativecommons.org/licenses/by-nc-sa/4.0/)
+#
+"""
+Fetch and parse statistics of Gismeteo data objects.
+
+For more details about this platform, please refer to the documentation at
+https://github.com/Limych/ha-gismeteo/
+"""
+import time
+
+ATTR_REQUESTS = 'requests'
+ATTR_REQUEST_ERRORS = 'request_errors'
+ATTR_SHARED_REQUESTS = 'shared_requests'
+ATTR_HTTP_LATENCY = 'http_latency'
+ATTR_BYTES_DOWNLOADED = 'bytes_downloaded'
+ATTR_CACHE_HITS = 'cache_hits'
+ATTR_CACHE_MISSES = 'cache_misses'
+ATTR_CACHE_REVALIDATIONS = 'cache_revalidations'
+ATTR_CACHE_HIT_RATIO = 'cache_hit_ratio'
+ATTR_PARSE_TIME = 'parse_time'
+ATTR_FORECAST_RECORDS = 'forecast_records'
+ATTR_PROJECTION_TIME = 'projection_time'
+
+
+def _ms(seconds):
+    """Return duration in milliseconds or None if it is not measured."""
+    return round(seconds * 1000, 1) if seconds is not None else None
+
+
+class Metrics:
+    """Statistics of data fetching and parsing of one data object.
+
+    Durations are of the last operation, counters are totals since start.
+    Requests are counted per attempt; results of requests of other data
+    objects joined while in flight are counted as shared requests."""
+
+    def __init__(self):
+        """Initialize the statistics."""
+        self.requests = 0
+        self.request_errors = 0
+        self.shared_requests = 0
+        self.http_latency = None
+        self.bytes_downloaded = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.cache_revalidations = 0
+        self.parse_time = None
+        self.forecast_records = 0
+        self.projection_time = None
+
+    @staticmethod
+    def timer():
+        """Return start point for duration measurement."""
+        return time.perf_counter()
+
+    @staticmethod
+    def elapsed(start):
+        """Return duration passed since start point in seconds."""
+        return time.perf_counter() - start
+
+    def add_request(self, start, response):
+        """Account finished HTTP request."""
+        self.requests += 1
+        self.http_latency = self.elapsed(start)
+        if response:
+            self.bytes_downloaded += len(response)
+        else:
+            self.request_errors += 1
+
+    def add_shared(self, start, response):
+        """Account result of request of other data object joined in flight."""
+        self.shared_requests += 1
+        self.http_latency = self.elapsed(start)
+        if not response:
+            self.request_errors += 1
+
+    def add_revalidation(self, start):
+        """Account request answered with not modified data."""
+        self.requests += 1
+        self.http_latency = self.elapsed(start)
+        self.cache_revalidations += 1
+
+    def add_cache_lookup(self, hit):
+        """Account lookup of data in cache."""
+        if hit:
+            self.cache_hits += 1
+        else:
+            self.cache_misses += 1
+
+    @property
+    def cache_hit_ratio(self):
+        """Return ratio of requests served from cache without API."""
+        total = self.cache_hits + self.cache_misses
+        return round(self.cache_hits / total, 3) if total else None
+
+    def as_dict(self):
+        """Return statistics as state attributes; durations are in ms."""
+        return {
+            ATTR_REQUESTS: self.requests,
+            ATTR_REQUEST_ERRORS: self.request_errors,
+            ATTR_SHARED_REQUESTS: self.shared_requests,
+            ATTR_HTTP_LATENCY: _ms(self.http_latency),
+            ATTR_BYTES_DOWNLOADED: self.bytes_downloaded,
+            ATTR_CACHE_HITS: self.cache_hits,
+            ATTR_CACHE_MISSES: self.cache_misses,
+            ATTR_CACHE_REVALIDATIONS: self.cache_revalidations,
+            ATTR_CACHE_HIT_RATIO: self.cache_hit_ratio,
+            ATTR_PARSE_TIME: _ms(self.parse_time),
+            ATTR_FORECAST_RECORDS: self.forecast_records,
+            ATTR_PROJECTION_TIME: _ms(self.projection_time),
+        }
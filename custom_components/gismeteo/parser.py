@@ -0,0 +1,168 @@
+#
+#  Copyright (c) 2019, Andrey "Limych" Khrolenok <andrey@khrolenok.ru>
+#  Creative Commons BY-NC-SA 4.0 International Public License
+#  (see LICENSE.md or https://creativecommons.org/licenses/by-nc-sa/4.0/)
+#
+"""
+Streaming parser of Gismeteo API responses.
+
+For more details about this platform, please refer to the documentation at
+https://github.com/Limych/ha-gismeteo/
+"""
+import xml.etree.ElementTree as etree
+from io import BytesIO
+
+from homeassistant.components.weather import (
+    ATTR_FORECAST_CONDITION, ATTR_FORECAST_TEMP, ATTR_FORECAST_TEMP_LOW,
+    ATTR_FORECAST_TIME, ATTR_FORECAST_WIND_BEARING, ATTR_FORECAST_WIND_SPEED)
+from homeassistant.util import dt as dt_util
+
+from .condition import get_condition
+from .const import (
+    ATTR_FORECAST_HUMIDITY, ATTR_FORECAST_PRESSURE, ATTR_SUNRISE, ATTR_SUNSET,
+    ATTR_FORECAST_CLOUDINESS, ATTR_FORECAST_PRECIPITATION_TYPE,
+    ATTR_FORECAST_PRECIPITATION_AMOUNT, ATTR_FORECAST_PRECIPITATION_INTENSITY,
+    ATTR_FORECAST_STORM, ATTR_FORECAST_GEOMAGNETIC_FIELD,
+    ATTR_FORECAST_PHENOMENON, FORECAST_MODE_HOURLY)
+
+# Weather condition classified once at parse time
+ATTR_HA_CONDITION = 'ha_condition'
+
+
+class WeatherRecord:
+    """Weather values of current time or of one forecast period.
+
+    Fields are named after attribute keys of weather data, so records are
+    read with get() just like dicts."""
+
+    __slots__ = (
+        ATTR_SUNRISE, ATTR_SUNSET, ATTR_FORECAST_TIME, ATTR_FORECAST_CONDITION,
+        ATTR_FORECAST_TEMP, ATTR_FORECAST_TEMP_LOW, ATTR_FORECAST_PRESSURE,
+        ATTR_FORECAST_HUMIDITY, ATTR_FORECAST_WIND_SPEED,
+        ATTR_FORECAST_WIND_BEARING, ATTR_FORECAST_CLOUDINESS,
+        ATTR_FORECAST_PRECIPITATION_TYPE, ATTR_FORECAST_PRECIPITATION_AMOUNT,
+        ATTR_FORECAST_PRECIPITATION_INTENSITY, ATTR_FORECAST_STORM,
+        ATTR_FORECAST_GEOMAGNETIC_FIELD, ATTR_FORECAST_PHENOMENON,
+        ATTR_HA_CONDITION,
+    )
+
+    def __init__(self, fields: dict):
+        """Initialize the record."""
+        for key, value in fields.items():
+            setattr(self, key, value)
+
+    def get(self, key, default=None):
+        """Return value of the field or default if it is not set."""
+        return getattr(self, key, default)
+
+
+def _tz_suffix(tzone):
+    """Return ISO 8601 suffix of time zone offset in minutes."""
+    tz_h, tz_m = divmod(abs(tzone), 60)
+    return "{}{:02}:{:02}".format('+' if tzone >= 0 else '-', tz_h, tz_m)
+
+
+def get_utime(source, tz_suffix):
+    """Return timestamp of local date/time string from API response."""
+    if len(source) <= 10:
+        source += 'T00:00:00'
+    return dt_util.as_timestamp(source + tz_suffix)
+
+
+def _values(attrib):
+    """Return weather values common for all records."""
+    pr_amount = attrib.get('prflt')
+    if pr_amount is not None:
+        pr_amount = float(pr_amount)
+
+    return {
+        ATTR_FORECAST_CONDITION: attrib.get('descr'),
+        ATTR_FORECAST_PRESSURE: int(attrib.get('p')),
+        ATTR_FORECAST_HUMIDITY: int(attrib.get('hum')),
+        ATTR_FORECAST_WIND_SPEED: int(attrib.get('ws')),
+        ATTR_FORECAST_WIND_BEARING: int(attrib.get('wd')),
+        ATTR_FORECAST_CLOUDINESS: int(attrib.get('cl')),
+        ATTR_FORECAST_PRECIPITATION_TYPE: int(attrib.get('pt')),
+        ATTR_FORECAST_PRECIPITATION_AMOUNT: pr_amount,
+        ATTR_FORECAST_PRECIPITATION_INTENSITY: int(attrib.get('pr')),
+        ATTR_FORECAST_STORM: (attrib.get('ts') == '1'),
+    }
+
+
+def parse_forecast(source, mode):
+    """Parse current weather and forecast from API response.
+
+    Elements are processed and freed while the document is read, so whole
+    document tree is never kept in memory. Return (current, forecast) where
+    current is None if the response has no current weather.
+
+    Forecast records are classified at once, condition of current weather
+    depends on time of the day and is classified on demand."""
+    if isinstance(source, str):
+        source = source.encode('utf-8')
+
+    current = None
+    forecast = []
+    tz_suffix = _tz_suffix(0)
+    location = None
+    sunrise = sunset = None
+    for event, elem in etree.iterparse(
+            BytesIO(source), events=('start', 'end')):
+        tag = elem.tag
+        if event == 'start':
+            if tag == 'location':
+                location = elem
+                tz_suffix = _tz_suffix(int(elem.get('tzone')))
+            elif tag == 'day' and mode == FORECAST_MODE_HOURLY:
+                sunrise = int(elem.get('sunrise'))
+                sunset = int(elem.get('sunset'))
+            continue
+
+        if tag == 'fact':
+            attrib = elem.find('values').attrib
+            fields = _values(attrib)
+            fields.update({
+                ATTR_SUNRISE: int(elem.get('sunrise')),
+                ATTR_SUNSET: int(elem.get('sunset')),
+                ATTR_FORECAST_TEMP: float(attrib.get('tflt')),
+                ATTR_FORECAST_GEOMAGNETIC_FIELD: int(attrib.get('grade')),
+                ATTR_FORECAST_PHENOMENON: int(attrib.get('ph')),
+            })
+            current = WeatherRecord(fields)
+            elem.clear()
+
+        elif tag == 'forecast' and mode == FORECAST_MODE_HOURLY:
+            attrib = elem.find('values').attrib
+            fields = _values(attrib)
+            fields.update({
+                ATTR_SUNRISE: sunrise,
+                ATTR_SUNSET: sunset,
+                ATTR_FORECAST_TIME: get_utime(elem.get('valid'), tz_suffix),
+                ATTR_FORECAST_TEMP: int(attrib.get('t')),
+                ATTR_FORECAST_GEOMAGNETIC_FIELD: int(attrib.get('grade')),
+            })
+            fields[ATTR_HA_CONDITION] = get_condition(fields, False)
+            forecast.append(WeatherRecord(fields))
+            elem.clear()
+
+        elif tag == 'day':
+            attrib = elem.attrib
+            if mode != FORECAST_MODE_HOURLY and 'descr' in attrib:
+                fields = _values(attrib)
+                fields.update({
+                    ATTR_SUNRISE: int(attrib.get('sunrise')),
+                    ATTR_SUNSET: int(attrib.get('sunset')),
+                    ATTR_FORECAST_TIME: get_utime(
+                        attrib.get('date'), tz_suffix),
+                    ATTR_FORECAST_TEMP: int(attrib.get('tmax')),
+                    ATTR_FORECAST_TEMP_LOW: int(attrib.get('tmin')),
+                    ATTR_FORECAST_GEOMAGNETIC_FIELD:
+                        int(attrib.get('grademax')),
+                })
+                fields[ATTR_HA_CONDITION] = get_condition(fields, True)
+                forecast.append(WeatherRecord(fields))
+            elem.clear()
+            if location is not None:
+                location.remove(elem)
+
+    return current, forecast
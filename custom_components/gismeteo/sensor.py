@@ -21,12 +21,13 @@ from homeassistant.helpers import config_validation as cv
 from homeassistant.helpers.entity import Entity
 from homeassistant.helpers.storage import STORAGE_DIR
 
-from . import Gismeteo
+from . import async_get_gismeteo
 from .const import (
     ATTRIBUTION, DEFAULT_NAME, MIN_TIME_BETWEEN_UPDATES, CONF_CACHE_DIR,
     ATTR_WEATHER_CLOUDINESS, ATTR_WEATHER_PRECIPITATION_TYPE,
     ATTR_WEATHER_PRECIPITATION_AMOUNT, ATTR_WEATHER_PRECIPITATION_INTENSITY,
     ATTR_WEATHER_STORM, ATTR_WEATHER_GEOMAGNETIC_FIELD, VERSION)
+from .metrics import ATTR_HTTP_LATENCY
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -47,6 +48,7 @@ SENSOR_TYPES = {
     'snow': ['Snow', 'mm', 'mdi:weather-snowy'],
     'storm': ['Storm', None, 'mdi:weather-lightning'],
     'geomagnetic': ['Geomagnetic field', '', 'mdi:magnet-on'],
+    'diagnostics': ['Diagnostics', 'ms', 'mdi:timer'],
 }
 
 PLATFORM_SCHEMA = PLATFORM_SCHEMA.extend({
@@ -60,7 +62,8 @@ PLATFORM_SCHEMA = PLATFORM_SCHEMA.extend({
 })
 
 
-def setup_platform(hass, config, add_entities, discovery_info=None):
+async def async_setup_platform(hass, config, async_add_entities,
+                               discovery_info=None):
     """Set up the Gismeteo weather platform."""
     if None in (hass.config.latitude, hass.config.longitude):
         _LOGGER.error("Latitude or longitude not set in Home Assistant config")
@@ -72,7 +75,7 @@ def setup_platform(hass, config, add_entities, discovery_info=None):
     forecast = config.get(CONF_FORECAST)
     cache_dir = config.get(CONF_CACHE_DIR, hass.config.path(STORAGE_DIR))
 
-    gm = Gismeteo(latitude, longitude, params={
+    gm = async_get_gismeteo(hass, latitude, longitude, params={
         'timezone': str(hass.config.time_zone),
         'cache_dir': cache_dir,
         'cache_time': MIN_TIME_BETWEEN_UPDATES.total_seconds(),
@@ -90,7 +93,7 @@ def setup_platform(hass, config, add_entities, discovery_info=None):
             name, gm, 'forecast', SENSOR_TYPES['forecast'][1],
             SENSOR_TYPES['forecast'][2]))
 
-    add_entities(dev, True)
+    async_add_entities(dev, True)
 
 
 class GismeteoSensor(Entity):
@@ -108,9 +111,9 @@ class GismeteoSensor(Entity):
         self._unit_of_measurement = SENSOR_TYPES[sensor_type][1]
         self._icon = icon
 
-    def update(self):
+    async def async_update(self):
         """Get the latest data from Gismeteo and updates the states."""
-        self._wd.update()
+        await self._wd.async_update()
 
         if self._wd._current is None:
             return
@@ -155,6 +158,8 @@ class GismeteoSensor(Entity):
                 self._state = data.get(ATTR_WEATHER_STORM)
             elif self.type == 'geomagnetic':
                 self._state = data.get(ATTR_WEATHER_GEOMAGNETIC_FIELD)
+            elif self.type == 'diagnostics':
+                self._state = self._wd.metrics.as_dict()[ATTR_HTTP_LATENCY]
         except KeyError:
             self._state = None
             _LOGGER.warning("Condition is currently not available: %s",
@@ -163,9 +168,12 @@ class GismeteoSensor(Entity):
     @property
     def device_state_attributes(self):
         """Return the state attributes."""
-        return {
+        attrs = {
             ATTR_ATTRIBUTION: ATTRIBUTION,
         }
+        if self.type == 'diagnostics':
+            attrs.update(self._wd.metrics.as_dict())
+        return attrs
 
     @property
     def name(self):
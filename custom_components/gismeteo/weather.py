@@ -20,7 +20,7 @@ from homeassistant.const import (
 from homeassistant.helpers import config_validation as cv
 from homeassistant.helpers.storage import STORAGE_DIR
 
-from . import Gismeteo
+from . import async_get_gismeteo
 from .const import (
     ATTRIBUTION, DEFAULT_NAME, MIN_TIME_BETWEEN_UPDATES, CONF_CACHE_DIR,
     VERSION, FORECAST_MODE_HOURLY, FORECAST_MODE_DAILY)
@@ -38,7 +38,8 @@ PLATFORM_SCHEMA = PLATFORM_SCHEMA.extend({
 })
 
 
-def setup_platform(hass, config, add_entities, discovery_info=None):
+async def async_setup_platform(hass, config, async_add_entities,
+                               discovery_info=None):
     """Set up the Gismeteo weather platform."""
     name = config.get(CONF_NAME)
     latitude = config.get(CONF_LATITUDE, round(hass.config.latitude, 6))
@@ -46,13 +47,13 @@ def setup_platform(hass, config, add_entities, discovery_info=None):
     cache_dir = config.get(CONF_CACHE_DIR, hass.config.path(STORAGE_DIR))
     mode = config.get(CONF_MODE)
 
-    gm = Gismeteo(latitude, longitude, mode, params={
+    gm = async_get_gismeteo(hass, latitude, longitude, mode, params={
         'timezone': str(hass.config.time_zone),
         'cache_dir': cache_dir,
         'cache_time': MIN_TIME_BETWEEN_UPDATES.total_seconds(),
     })
 
-    add_entities([GismeteoWeather(name, gm)], True)
+    async_add_entities([GismeteoWeather(name, gm)], True)
 
 
 class GismeteoWeather(WeatherEntity):
@@ -63,9 +64,9 @@ class GismeteoWeather(WeatherEntity):
         self._station_name = station_name
         self._wd = weather_data
 
-    def update(self):
+    async def async_update(self):
         """Get the latest data from Gismeteo and updates the states."""
-        self._wd.update()
+        await self._wd.async_update()
 
     @property
     def attribution(self):
@@ -116,3 +117,14 @@ class GismeteoWeather(WeatherEntity):
     def forecast(self):
         """Return the forecast array."""
         return self._wd.forecast()
+
+    def forecast_between(self, start_time, end_time):
+        """Return forecast periods started in [start_time, end_time).
+
+        Times are UNIX timestamps; periods are found by bisection of sorted
+        forecast times without parsing them."""
+        return self._wd.forecast_between(start_time, end_time)
+
+    def forecast_after(self, after_time):
+        """Return the first forecast period started after given time."""
+        return self._wd.forecast_after(after_time)
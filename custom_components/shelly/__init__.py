@@ -6,8 +6,10 @@ https://home-assistant.io/components/shelly/
 """
 # pylint: disable=broad-except, bare-except, invalid-name, import-error
 
+from collections import deque
 from datetime import timedelta
 import logging
+from threading import Lock
 import time
 
 import voluptuous as vol
@@ -15,6 +17,7 @@ import voluptuous as vol
 from homeassistant.const import (
     CONF_DEVICES, CONF_DISCOVERY, CONF_ID, CONF_NAME, CONF_PASSWORD,
     CONF_SCAN_INTERVAL, CONF_USERNAME, EVENT_HOMEASSISTANT_STOP)
+from homeassistant.core import callback
 from homeassistant.helpers import discovery
 import homeassistant.helpers.config_validation as cv
 from homeassistant.helpers.entity import Entity
@@ -39,6 +42,7 @@ CONF_ENTITY_ID = 'entity_id'
 CONF_SHOW_ID_IN_NAME = 'show_id_in_name'
 CONF_VERSION = 'version'
 CONF_POWER_DECIMALS = 'power_decimals'
+CONF_POWER_WINDOW = 'power_window'
 CONF_SENSORS = 'sensors'
 CONF_UPGRADE_SWITCH = 'upgrade_switch'
 CONF_UNAVALABLE_AFTER_SEC = 'unavailable_after_sec'
@@ -59,9 +63,13 @@ DEFAULT_SCAN_INTERVAL = timedelta(seconds=60)
 DEFAULT_SHOW_ID_IN_NAME = True
 DEFAULT_MDNS = True
 
+#Bursts of updates within the window are written as one state
+UPDATE_COALESCE_SEC = 0.5
+
 SHELLY_DEVICES = 'shelly_devices'
 SHELLY_BLOCKS = 'shelly_blocks'
 SHELLY_CONFIG = 'shelly_cfg'
+SHELLY_BRIDGE = 'shelly_bridge'
 SHELLY_DEVICE_ID = 'device_id'
 SHELLY_BLOCK_ID = 'block_id'
 
@@ -91,6 +99,11 @@ SENSOR_TYPES = {
     SENSOR_SWITCH : {}
 }
 
+#Sensor type of info value attribute
+SENSOR_ATTRS = {sensor_type['attr']: sensor
+                for sensor, sensor_type in SENSOR_TYPES.items()
+                if 'attr' in sensor_type}
+
 SENSOR_SCHEMA = vol.Schema({
     vol.Optional(CONF_NAME): cv.string,
 })
@@ -135,6 +148,7 @@ CONFIG_SCHEMA = vol.Schema({
         vol.Optional(CONF_SCAN_INTERVAL,
                      default=DEFAULT_SCAN_INTERVAL): cv.time_period,
         vol.Optional(CONF_POWER_DECIMALS): cv.positive_int,
+        vol.Optional(CONF_POWER_WINDOW): cv.positive_int,
         vol.Optional(CONF_LOCAL_PY_SHELLY,
                      default=False): cv.boolean,
         vol.Optional(CONF_ONLY_DEVICE_ID) : cv.string,
@@ -150,8 +164,10 @@ CONFIG_SCHEMA = vol.Schema({
 
 BLOCKS = {}
 DEVICES = {}
-BLOCK_SENSORS = []
-DEVICE_SENSORS = []
+BLOCK_SENSORS = {}
+DEVICE_SENSORS = {}
+DEVICE_CONFIGS = {}
+EFFECTIVE_CONFIGS = {}
 
 def _get_block_key(block):
     key = block.id
@@ -182,12 +198,36 @@ def get_device_from_hass(hass, discovery_info):
     device_key = discovery_info[SHELLY_DEVICE_ID]
     return hass.data[SHELLY_DEVICES][device_key]
 
-def _find_device_config(conf, device_id):
-    device_conf_list = conf.get(CONF_DEVICES)
-    for item in device_conf_list:
-        if item[CONF_ID].upper() == device_id:
-            return item
-    return None
+def _index_device_configs(conf):
+    """Index configured devices by normalized ID"""
+    DEVICE_CONFIGS.clear()
+    EFFECTIVE_CONFIGS.clear()
+    for item in conf.get(CONF_DEVICES):
+        #First entry wins for duplicated IDs
+        DEVICE_CONFIGS.setdefault(item[CONF_ID].upper(), item)
+
+def _find_device_config(_conf, device_id):
+    return DEVICE_CONFIGS.get(device_id)
+
+def _get_effective_config(ids):
+    """Get merged config of devices, first ID has priority"""
+    item = EFFECTIVE_CONFIGS.get(ids)
+    if item is None:
+        item = {}
+        for device_id in reversed(ids):
+            item.update(DEVICE_CONFIGS.get(device_id, {}))
+        EFFECTIVE_CONFIGS[ids] = item
+    return item
+
+def _new_info_keys(registry, obj_id, info_values):
+    """Get info value keys not seen before for the block or device
+    and register them"""
+    seen = registry.setdefault(obj_id, set())
+    new_keys = info_values.keys() - seen
+    if not new_keys:
+        return []
+    seen.update(new_keys)
+    return [key for key in info_values if key in new_keys]
 
 def _get_device_config(conf, device_id, id_2=None):
     """Get config for device."""
@@ -198,12 +238,8 @@ def _get_device_config(conf, device_id, id_2=None):
         return {}
     return item
 
-def _get_specific_config(conf, key, default, *ids):
-    for device_id in ids:
-        item = _find_device_config(conf, device_id)
-        if item is not None and key in item:
-            return item[key]
-    return default
+def _get_specific_config(_conf, key, default, *ids):
+    return _get_effective_config(ids).get(key, default)
 
 def _get_specific_config_root(conf, key, *ids):
     item = _get_specific_config(conf, key, None, *ids)
@@ -221,6 +257,59 @@ def _get_sensor_config(conf, *ids):
         return {}
     return sensors
 
+@callback
+def _async_load_platform(hass, component, attr, hass_config):
+    """Load platform for discovered entity from event loop"""
+    hass.async_create_task(discovery.async_load_platform(
+        hass, component, DOMAIN, attr, hass_config))
+
+class ShellyBridge:
+    """Pass pyShelly events from its threads to event loop.
+
+    Events are handled in order of arrival. Loop is woken up once for
+    all events queued meanwhile, repeated updates of the same object
+    in the batch are handled once."""
+
+    def __init__(self, hass):
+        self._hass = hass
+        self._queue = deque()
+        self._pending = set()
+        self._lock = Lock()
+        self._scheduled = False
+
+    def wrap(self, handler, coalesce=False):
+        """Get pyShelly callback queuing event for the handler"""
+        def _queue_event(*args):
+            self.put(handler, *args, coalesce=coalesce)
+        return _queue_event
+
+    def put(self, handler, *args, coalesce=False):
+        """Queue event, can be called from any thread"""
+        with self._lock:
+            if coalesce:
+                if (handler, args) in self._pending:
+                    return
+                self._pending.add((handler, args))
+            self._queue.append((handler, args))
+            if self._scheduled:
+                return
+            self._scheduled = True
+        self._hass.loop.call_soon_threadsafe(self._drain)
+
+    @callback
+    def _drain(self):
+        """Handle queued events"""
+        with self._lock:
+            events = list(self._queue)
+            self._queue.clear()
+            self._pending.clear()
+            self._scheduled = False
+        for handler, args in events:
+            try:
+                handler(*args)
+            except Exception:
+                _LOGGER.exception("Error handling Shelly event")
+
 def setup(hass, config):
     """Setup Shelly component"""
     _LOGGER.info("Starting shelly, %s", __version__)
@@ -230,6 +319,7 @@ def setup(hass, config):
     additional_info = conf.get(CONF_ADDITIONAL_INFO)
     hass.data[SHELLY_CONFIG] = conf
     discover = conf.get(CONF_DISCOVERY)
+    _index_device_configs(conf)
 
     if conf.get(CONF_LOCAL_PY_SHELLY):
         _LOGGER.info("Loading local pyShelly")
@@ -240,6 +330,7 @@ def setup(hass, config):
 
     hass.data[SHELLY_DEVICES] = DEVICES
     hass.data[SHELLY_BLOCKS] = BLOCKS
+    bridge = hass.data[SHELLY_BRIDGE] = ShellyBridge(hass)
 
     if conf.get(CONF_WIFI_SENSOR) is not None:
         _LOGGER.warning("wifi_sensor is deprecated, use rssi in sensors instead.")
@@ -251,6 +342,7 @@ def setup(hass, config):
         if conf.get(CONF_UPTIME_SENSOR) and SENSOR_UPTIME not in conf[CONF_SENSORS]:
             conf[CONF_SENSORS].append(SENSOR_UPTIME)
 
+    @callback
     def _block_updated(block):
 
         hass_data = block.hass_data
@@ -263,25 +355,20 @@ def setup(hass, config):
                     if update_switch is None:
                         attr = {'firmware': True,
                                 SHELLY_BLOCK_ID : _get_block_key(block)}
-                        discovery.load_platform(hass, 'switch',
-                                                DOMAIN, attr, conf)
+                        _async_load_platform(hass, 'switch', attr, conf)
                 elif update_switch is not None:
                     update_switch.remove()
 
-            block_key = _get_block_key(block)
-            for key, _value in block.info_values.items():
-                ukey = block.id + '-' + key
-                if not ukey in BLOCK_SENSORS:
-                    BLOCK_SENSORS.append(ukey)
-                    for sensor in hass_data['sensor_cfg']:
-                        if SENSOR_TYPES[sensor].get('attr') == key:
-                            attr = {'sensor_type':key,
-                                    SHELLY_BLOCK_ID : block_key}
-                            discovery.load_platform(hass, 'sensor',
-                                                    DOMAIN, attr, conf)
+            for key in _new_info_keys(BLOCK_SENSORS, block.id,
+                                      block.info_values):
+                if SENSOR_ATTRS.get(key) in hass_data['sensor_cfg']:
+                    attr = {'sensor_type':key,
+                            SHELLY_BLOCK_ID : _get_block_key(block)}
+                    _async_load_platform(hass, 'sensor', attr, conf)
 
+    @callback
     def _block_added(block):
-        block.cb_updated.append(_block_updated)
+        block.cb_updated.append(bridge.wrap(_block_updated, coalesce=True))
         _get_block_key(block)
 
         discover_block = discover or _get_device_config(conf, block.id) != {}
@@ -310,6 +397,7 @@ def setup(hass, config):
             #         discovery.load_platform(hass, 'sensor', DOMAIN, attr,
             #                                 config)
 
+    @callback
     def _device_added(dev, _code):
         device_key = _get_device_key(dev)
         attr = {SHELLY_DEVICE_ID : device_key}
@@ -319,27 +407,31 @@ def setup(hass, config):
             return
 
         if dev.device_type == "ROLLER":
-            discovery.load_platform(hass, 'cover', DOMAIN, attr, config)
+            _async_load_platform(hass, 'cover', attr, config)
         elif dev.device_type == "RELAY":
             if device_config.get(CONF_LIGHT_SWITCH):
-                discovery.load_platform(hass, 'light', DOMAIN, attr, config)
+                _async_load_platform(hass, 'light', attr, config)
             else:
-                discovery.load_platform(hass, 'switch', DOMAIN, attr, config)
+                _async_load_platform(hass, 'switch', attr, config)
         elif dev.device_type == 'POWERMETER':
             sensor_cfg = _get_sensor_config(conf, dev.id, dev.block.id)
             if SENSOR_POWER in sensor_cfg:
-                discovery.load_platform(hass, 'sensor', DOMAIN, attr, config)
+                _async_load_platform(hass, 'sensor', attr, config)
         elif dev.device_type == 'SWITCH':
             sensor_cfg = _get_sensor_config(conf, dev.id, dev.block.id)
             if SENSOR_SWITCH in sensor_cfg:
-                discovery.load_platform(hass, 'sensor', DOMAIN, attr, config)
+                _async_load_platform(hass, 'sensor', attr, config)
         elif dev.device_type in ["SENSOR"]: #, "INFOSENSOR"]:
-            discovery.load_platform(hass, 'sensor', DOMAIN, attr, config)
+            _async_load_platform(hass, 'sensor', attr, config)
         elif dev.device_type in ["LIGHT", "DIMMER"]:
-            discovery.load_platform(hass, 'light', DOMAIN, attr, config)
+            _async_load_platform(hass, 'light', attr, config)
 
+    @callback
     def _device_removed(dev, _code):
-        dev.shelly_device.remove()
+        #Entity could be not created yet or not discovered at all
+        shelly_device = getattr(dev, 'shelly_device', None)
+        if shelly_device is not None:
+            shelly_device.remove()
         try:
             key = _dev_key(dev)
             del DEVICES[key]
@@ -348,9 +440,9 @@ def setup(hass, config):
 
     pys = pyShelly()
     _LOGGER.info("pyShelly, %s", pys.version())
-    pys.cb_block_added.append(_block_added)
-    pys.cb_device_added.append(_device_added)
-    pys.cb_device_removed.append(_device_removed)
+    pys.cb_block_added.append(bridge.wrap(_block_added))
+    pys.cb_device_added.append(bridge.wrap(_device_added))
+    pys.cb_device_removed.append(bridge.wrap(_device_removed))
     pys.username = conf.get(CONF_USERNAME)
     pys.password = conf.get(CONF_PASSWORD)
     pys.cloud_auth_key = conf.get(CONF_CLOUD_AUTH_KEY)
@@ -370,7 +462,7 @@ def setup(hass, config):
 
     if conf.get(CONF_VERSION):
         attr = {'version': VERSION, 'pyShellyVersion': pys.version()}
-        discovery.load_platform(hass, 'sensor', DOMAIN, attr, config)
+        bridge.put(_async_load_platform, hass, 'sensor', attr, config)
 
     def stop_shelly(_):
         """Stop Shelly."""
@@ -394,7 +486,31 @@ def setup(hass, config):
 
     return True
 
-class ShellyBlock(Entity):
+class ShellyEntity(Entity):
+    """Base class for Shelly entities with coalesced state writes"""
+
+    _write_handle = None
+    _is_removed = False
+
+    @callback
+    def _coalesce_update(self):
+        """Refresh entity and schedule state write after burst of
+        updates is over"""
+        update = getattr(self, 'update', None)
+        if update is not None:
+            update()
+        if self._write_handle is None:
+            self._write_handle = self.hass.loop.call_later(
+                UPDATE_COALESCE_SEC, self._write_state)
+
+    @callback
+    def _write_state(self):
+        """Write state refreshed by burst of updates"""
+        self._write_handle = None
+        if not self._is_removed:
+            self.async_schedule_update_ha_state(False)
+
+class ShellyBlock(ShellyEntity):
     """Base class for Shelly entities"""
 
     def __init__(self, block, hass, prefix=""):
@@ -414,7 +530,8 @@ class ShellyBlock(Entity):
         self._show_id_in_name = conf.get(CONF_SHOW_ID_IN_NAME)
         self._block = block
         self.hass = hass
-        self._block.cb_updated.append(self._updated)
+        self._block.cb_updated.append(
+            hass.data[SHELLY_BRIDGE].wrap(self._updated, coalesce=True))
         block.shelly_device = self
         self._name = _get_specific_config(conf, CONF_NAME, None, block.id)
         self._name_ext = None
@@ -433,12 +550,13 @@ class ShellyBlock(Entity):
             name += " [" + self._block.id + "]"
         return name
 
+    @callback
     def _updated(self, _block):
         """Receive events when the switch state changed (by mobile,
         switch etc)"""
 
         if self.entity_id is not None and not self._is_removed:
-            self.schedule_update_ha_state(True)
+            self._coalesce_update()
 
     @property
     def device_state_attributes(self):
@@ -459,7 +577,7 @@ class ShellyBlock(Entity):
         self._is_removed = True
         self.hass.add_job(self.async_remove)
 
-class ShellyDevice(Entity):
+class ShellyDevice(ShellyEntity):
     """Base class for Shelly entities"""
 
     def __init__(self, dev, hass):
@@ -478,7 +596,8 @@ class ShellyDevice(Entity):
         #    self._name += " [" + dev.id + "]"  # 'Test' #light.name
         self._dev = dev
         self.hass = hass
-        self._dev.cb_updated.append(self._updated)
+        self._dev.cb_updated.append(
+            hass.data[SHELLY_BRIDGE].wrap(self._updated, coalesce=True))
         dev.shelly_device = self
         self._name = _get_specific_config(conf, CONF_NAME, None,
                                           dev.id, dev.block.id)
@@ -487,24 +606,21 @@ class ShellyDevice(Entity):
 
         self._is_removed = False
 
+    @callback
     def _updated(self, _block):
         """Receive events when the switch state changed (by mobile,
         switch etc)"""
         if self.entity_id is not None and not self._is_removed:
-            self.schedule_update_ha_state(True)
+            self._coalesce_update()
 
         if self._dev.info_values is not None:
-            for key, _value in self._dev.info_values.items():
-                ukey = self._dev.id + '-' + key
-                if not ukey in DEVICE_SENSORS:
-                    DEVICE_SENSORS.append(ukey)
-                    for sensor in self._sensor_conf:
-                        if SENSOR_TYPES[sensor].get('attr') == key:
-                            attr = {'sensor_type':key,
-                                    SHELLY_DEVICE_ID:_get_device_key(self._dev)}
-                            conf = self.hass.data[SHELLY_CONFIG]
-                            discovery.load_platform(self.hass, 'sensor',
-                                                    DOMAIN, attr, conf)
+            for key in _new_info_keys(DEVICE_SENSORS, self._dev.id,
+                                      self._dev.info_values):
+                if SENSOR_ATTRS.get(key) in self._sensor_conf:
+                    attr = {'sensor_type':key,
+                            SHELLY_DEVICE_ID:_get_device_key(self._dev)}
+                    conf = self.hass.data[SHELLY_CONFIG]
+                    _async_load_platform(self.hass, 'sensor', attr, conf)
 
     @property
     def name(self):
@@ -15,8 +15,10 @@ from homeassistant.const import (DEVICE_CLASS_HUMIDITY,
                                  TEMP_CELSIUS, POWER_WATT,
                                  STATE_ON, STATE_OFF)
 from homeassistant.helpers.entity import Entity
+from homeassistant.helpers.restore_state import RestoreEntity
 
-from . import (CONF_OBJECT_ID_PREFIX, CONF_POWER_DECIMALS, SHELLY_CONFIG,
+from . import (CONF_OBJECT_ID_PREFIX, CONF_POWER_DECIMALS, CONF_POWER_WINDOW,
+               SHELLY_CONFIG,
                ShellyDevice, get_device_from_hass,
                ShellyBlock, get_block_from_hass)
 
@@ -37,6 +39,9 @@ SENSOR_TYPE_SWITCH = 'switch'
 SENSOR_TYPE_FLOOD = 'flood'
 SENSOR_TYPE_DEFAULT = 'default'
 
+ATTR_POWER_MAX = 'power_max'
+ATTR_ENERGY = 'energy_wh'
+
 SENSOR_TYPES_CFG = {
     SENSOR_TYPE_DEFAULT:
         [None, None, None, None, None],
@@ -95,7 +100,61 @@ def setup_platform(hass, _config, add_devices, discovery_info=None):
     elif dev.device_type == "SWITCH":
         add_devices([ ShellySwitch(dev, hass) ])
 
-class ShellySensor(ShellyDevice, Entity):
+class PowerWindow:
+    """Aggregate power readings over fixed time windows.
+
+    Time weighted area and peak of current window are updated as readings
+    arrive, so finishing a window only divides. Only mean and maximum of
+    the last finished window are published with energy integrated over all
+    readings till its end. Each reading is held till the next one, so it
+    weights mean of the next window too, but peak counts only readings
+    taken inside the window."""
+
+    def __init__(self, window):
+        self._window = window
+        self._start = None
+        self._last = None
+        self._area = 0.0
+        self._peak = None
+        self._energy = 0.0
+        self.mean = None
+        self.max = None
+        self.energy = None
+
+    def add(self, reading_time, power):
+        """Add reading, return True if a window was finished"""
+        finished = False
+        if self._last is not None:
+            last_time, last_power = self._last
+            self._energy += last_power * (reading_time - last_time) / 3600
+            self._area += last_power * \
+                (reading_time - max(last_time, self._start))
+        if self._start is None:
+            self._start = reading_time
+        elif reading_time - self._start >= self._window:
+            self._finish(reading_time)
+            finished = True
+
+        self._peak = power if self._peak is None else max(self._peak, power)
+        self._last = (reading_time, power)
+        return finished
+
+    def _finish(self, end_time):
+        """Publish aggregates of current window and start next one"""
+        duration = end_time - self._start
+        self.mean = self._area / duration if duration > 0 else self._last[1]
+        self.max = self._peak
+        self.energy = self._energy
+        self._start = end_time
+        self._area = 0.0
+        self._peak = None
+
+    def restore_energy(self, energy):
+        """Continue energy counting from value saved before restart"""
+        self._energy += energy
+        self.energy = self._energy
+
+class ShellySensor(ShellyDevice, RestoreEntity):
     """Representation of a Shelly Sensor."""
 
     def __init__(self, dev, hass, sensor_type, sensor_name):
@@ -111,8 +170,21 @@ class ShellySensor(ShellyDevice, Entity):
         self._state = None
         if self._sensor_type in SENSOR_TYPES_CFG:
             self._sensor_cfg = SENSOR_TYPES_CFG[self._sensor_type]
+        self._power_window = None
+        power_window = self._config.get(CONF_POWER_WINDOW)
+        if power_window and self._sensor_type == SENSOR_TYPE_POWER:
+            self._power_window = PowerWindow(power_window)
         self.update()
 
+    async def async_added_to_hass(self):
+        """Restore energy counted before restart"""
+        await super().async_added_to_hass()
+        if self._power_window is None:
+            return
+        state = await self.async_get_last_state()
+        if state is not None and state.attributes.get(ATTR_ENERGY):
+            self._power_window.restore_energy(state.attributes[ATTR_ENERGY])
+
     @property
     def state(self):
         """Return the state of the sensor."""
@@ -140,10 +212,27 @@ class ShellySensor(ShellyDevice, Entity):
         """Return the device class."""
         return self._sensor_cfg[3]
 
+    @property
+    def device_state_attributes(self):
+        """Show state attributes in HASS"""
+        attrs = ShellyDevice.device_state_attributes.fget(self)
+        if self._power_window is not None:
+            #Raw reading changes on every update, publish aggregates only
+            attrs.pop(self._sensor_name, None)
+            attrs[ATTR_POWER_MAX] = self._power_window.max
+            energy = self._power_window.energy
+            attrs[ATTR_ENERGY] = round(energy, 3) \
+                if energy is not None else None
+        return attrs
+
     def update(self):
         """Fetch new state data for this sensor."""
         if self._dev.sensor_values is not None:
             self._state = self._dev.sensor_values.get(self._sensor_name, None)
+            if self._power_window is not None:
+                if self._state is not None:
+                    self._power_window.add(time.time(), self._state)
+                self._state = self._power_window.mean
             power_decimals = self._config.get(CONF_POWER_DECIMALS, None)
             if self._state is not None \
                 and self._sensor_type == SENSOR_TYPE_POWER \